@@ -0,0 +1,166 @@
+import os
+import re
+import sys
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import traceback
+from pipeline import log_message, close_log, new_isolated_job, new_log_path, run_job
+from spans import trace_path, write_trace
+from metrics import job_status
+
+# 已经转换过的输出文件，例如 board-Ki-L2.zip，批量扫描时跳过
+CONVERTED_PATTERN = re.compile(r'-(LC|AD|Ki|Err)-(L\d+|Err)\.zip$')
+
+def collect_archives(paths):
+    # 支持传入目录或通配符，目录下只取第一层的.zip文件
+    archives = []
+    for path in paths:
+        if os.path.isdir(path):
+            matches = glob.glob(os.path.join(path, '*.zip'))
+        else:
+            matches = glob.glob(path)
+        for match in sorted(matches):
+            if not match.lower().endswith('.zip') or CONVERTED_PATTERN.search(match):
+                continue
+            match = os.path.abspath(match)
+            if match not in archives:
+                archives.append(match)
+    return archives
+
+def convert_archive(openjlc_dir, zip_file_path, log_file_path, options):
+    # 转换单个压缩包，任何失败都只影响当前压缩包，不中断整个批次
+    job = new_isolated_job(openjlc_dir, log_file_path)
+    job.update(options)
+    start = time.perf_counter()
+    log_message("[batch.py] XC Logs start collecting.", log_file_path)
+    try:
+        ok = run_job(job, zip_file_path)
+    except SystemExit:
+        ok = False
+    except Exception:
+        log_message(f"Error converting {zip_file_path}:\n{traceback.format_exc()}", log_file_path, 'ERROR')
+        ok = False
+    log_message("[batch.py] XC Logs done.", log_file_path)
+    # 工作进程退出时不会执行atexit，任务结束时主动写完并关闭日志
+    close_log(log_file_path)
+
+    return {
+        'archive': os.path.basename(zip_file_path),
+        'status': job_status(job, ok),
+        'source': job['source'] or '-',
+        'layers': job['layers'] or '-',
+        'output': os.path.basename(job['output']) if job['output'] else '-',
+        'seconds': time.perf_counter() - start,
+        'logs': log_file_path,
+        'trace_events': job['trace_events'],
+        'spans': job['spans'],
+    }
+
+def format_summary(results):
+    # 生成文本表格，列宽按内容自适应
+    columns = [('archive', 'Archive'), ('status', 'Status'), ('source', 'Source'),
+               ('layers', 'Layers'), ('output', 'Output'), ('seconds', 'Time(s)')]
+    rows = [[f"{r[key]:.2f}" if key == 'seconds' else str(r[key]) for key, _ in columns] for r in results]
+    widths = [max([len(title)] + [len(row[i]) for row in rows]) for i, (_, title) in enumerate(columns)]
+
+    lines = ['  '.join(title.ljust(widths[i]) for i, (_, title) in enumerate(columns)).rstrip()]
+    lines.append('  '.join('-' * width for width in widths))
+    for row in rows:
+        lines.append('  '.join(cell.ljust(widths[i]) for i, cell in enumerate(row)).rstrip())
+
+    converted = sum(1 for r in results if r['status'] == 'OK')
+    lines.append(f"{converted}/{len(results)} converted, {sum(r['seconds'] for r in results):.2f}s job time")
+    return '\n'.join(lines)
+
+def write_batch_trace(path, results):
+    # 合并所有任务的事件，每个压缩包在查看器中单独占一行
+    events = []
+    names = {}
+    for index, r in enumerate(results, 1):
+        for event in r['trace_events']:
+            events.append(dict(event, tid=index))
+            names[(event['pid'], index)] = r['archive']
+    write_trace(path, events, names)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert every Gerber .zip in a directory or glob.")
+    parser.add_argument('paths', nargs='+', help="directories or glob patterns of .zip archives")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="number of archives converted in parallel (default: CPU count)")
+    parser.add_argument('--stream', action='store_true', help="convert zip-to-zip without extracting to disk")
+    parser.add_argument('--trace', action='store_true', help="write Chrome trace.json files for every job and the whole batch")
+    parser.add_argument('--profile', action='store_true', help="run every stage under cProfile and save .pstats next to each job log")
+    parser.add_argument('--memory', action='store_true', help="record peak memory and top allocation sites of every stage")
+    parser.add_argument('--metrics', metavar='PATH', help="accumulate Prometheus metrics into this textfile")
+    parser.add_argument('--no-result-cache', action='store_true', help="always convert, even if the same archive was converted before")
+    parser.add_argument('--no-layer-cache', action='store_true', help="reprocess every layer, even if it is unchanged since an earlier revision")
+    args = parser.parse_args()
+
+    # 获取OpenJLC路径
+    openjlc_dir = os.environ.get("OpenJLC")
+    if not openjlc_dir:
+        print("Error: OpenJLC environment variable is not set.")
+        sys.exit(1)
+
+    batch_log_path = new_log_path(openjlc_dir, '-batch')
+
+    # 先收集全部输入，避免把本批次生成的输出文件再次当作输入
+    archives = collect_archives(args.paths)
+    if not archives:
+        log_message("No .zip files found.", batch_log_path)
+        sys.exit(1)
+    jobs = max(1, min(args.jobs, len(archives)))
+    batch_start = time.perf_counter()
+    log_message(f"Batch of {len(archives)} archives, {jobs} workers.", batch_log_path)
+
+    # 命令行选项会覆盖到每个任务的上下文中
+    options = {}
+    if args.stream:
+        options['stream'] = True
+    if args.trace:
+        options['trace'] = True
+    if args.profile:
+        options['profile'] = True
+    if args.memory:
+        options['memory'] = True
+    if args.metrics:
+        options['metrics'] = os.path.abspath(args.metrics)
+    if args.no_result_cache:
+        options['result_cache'] = None
+    if args.no_layer_cache:
+        options['layer_cache'] = None
+
+    # 每个压缩包使用独立的日志文件，结果按输入顺序汇总
+    log_paths = [batch_log_path.replace('-batch.log', f"-{index:04d}.log") for index in range(1, len(archives) + 1)]
+    results = [None] * len(archives)
+    done = 0
+
+    if jobs == 1:
+        for index, zip_file_path in enumerate(archives):
+            results[index] = convert_archive(openjlc_dir, zip_file_path, log_paths[index], options)
+            done += 1
+            log_message(f"[{done}/{len(archives)}] {results[index]['archive']}: {results[index]['status']}", batch_log_path)
+    else:
+        # 每个工作进程独立完成 解压 → 识别 → 转换 → 打包 的整个流程
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(convert_archive, openjlc_dir, zip_file_path, log_paths[index], options): index
+                       for index, zip_file_path in enumerate(archives)}
+            for future in as_completed(futures):
+                index = futures[future]
+                results[index] = future.result()
+                done += 1
+                log_message(f"[{done}/{len(archives)}] {results[index]['archive']}: {results[index]['status']}", batch_log_path)
+
+    log_message("Batch summary:\n" + format_summary(results), batch_log_path)
+    if any(r['trace_events'] for r in results):
+        write_batch_trace(trace_path(batch_log_path), results)
+        log_message(f"Trace written to {trace_path(batch_log_path)}", batch_log_path)
+    log_message(f"Batch finished in {time.perf_counter() - batch_start:.2f}s.", batch_log_path)
+
+    if any(r['status'] == 'Failed' for r in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
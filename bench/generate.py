@@ -0,0 +1,110 @@
+import os
+import sys
+import random
+import zipfile
+import argparse
+
+# 各EDA导出的层文件名，按 层数 取需要的铜层
+KICAD_COPPER = ['F_Cu', 'B_Cu', 'In1_Cu', 'In2_Cu', 'In3_Cu', 'In4_Cu']
+KICAD_OTHER = ['F_Mask', 'B_Mask', 'F_Silkscreen', 'B_Silkscreen', 'F_Paste', 'B_Paste', 'Edge_Cuts']
+ALTIUM_COPPER = ['GTL', 'GBL', 'G1', 'G2', 'G3', 'G4']
+ALTIUM_OTHER = ['GTS', 'GBS', 'GTO', 'GBO', 'GTP', 'GBP', 'GKO']
+LCEDA_COPPER = ['TopLayer.GTL', 'BottomLayer.GBL', 'InnerLayer1.G1', 'InnerLayer2.G2', 'InnerLayer3.G3', 'InnerLayer4.G4']
+LCEDA_OTHER = ['TopSolderMaskLayer.GTS', 'BottomSolderMaskLayer.GBS', 'TopSilkscreenLayer.GTO',
+               'BottomSilkscreenLayer.GBO', 'TopPasteMaskLayer.GTP', 'BottomPasteMaskLayer.GBP', 'BoardOutlineLayer.GKO']
+
+# 各EDA写在文件头中的标记，与identification.py中的指纹对应
+HEADERS = {
+    'kicad': "%TF.GenerationSoftware,KiCad,Pcbnew,8.0.0*%\n%TF.CreationDate,2024-01-01T00:00:00+08:00*%\nG04 Created by KiCad (PCBNEW 8.0.0) date 2024-01-01*\n",
+    'altium': "G04 Layer_Physical_Order=1*\nG04 Layer_Color=255*\nG04 Altium Designer 24.0*\n",
+    'lceda': "G04 EasyEDA Pro v2.2.22.1, 2024-01-01 00:00:00*\nG04 Gerber Generator version 0.3*\n",
+}
+DRILL_COMMENTS = {'kicad': '; DRILL file {KiCad 8.0.0}', 'altium': ';Altium Designer', 'lceda': ';EasyEDA'}
+
+def gerber_layer(eda, size, rng):
+    # 生成大约size字节的Gerber：文件头、光圈定义，然后是随机的走线和焊盘
+    lines = [HEADERS[eda], "%FSLAX46Y46*%\n%MOMM*%\n%LPD*%\n%ADD10C,0.150000*%\n%ADD11R,1.700000X1.700000*%\nD10*\n"]
+    written = sum(len(line) for line in lines)
+    x, y = 0, 0
+    while written < size:
+        x = max(0, x + rng.randint(-500000, 500000))
+        y = max(0, y + rng.randint(-500000, 500000))
+        line = f"X{x}Y{y}D0{rng.choice('12')}*\n"
+        lines.append(line)
+        written += len(line)
+    lines.append("M02*\n")
+    return ''.join(lines).encode('ascii')
+
+def drill_file(eda, hits, rng):
+    lines = ["M48\n", DRILL_COMMENTS[eda] + "\n", "METRIC,TZ\nT1C0.300\nT2C0.800\n%\nG90\nG05\n", "T1\n"]
+    for i in range(hits):
+        if i == hits // 2:
+            lines.append("T2\n")
+        lines.append(f"X{rng.randint(0, 100000)}Y{rng.randint(0, 100000)}\n")
+    lines.append("M30\n")
+    return ''.join(lines).encode('ascii')
+
+def junk_files(count, size, rng):
+    # 与任何规则都不匹配的附加文件，例如说明文档和装配图
+    return [(f"notes-{i}.pdf", rng.randbytes(size)) for i in range(count)]
+
+def board_members(eda, name, layers, size, drill_hits, junk, rng):
+    if eda == 'kicad':
+        members = [(f"{name}-{layer}.gbr", gerber_layer(eda, size, rng)) for layer in KICAD_COPPER[:layers] + KICAD_OTHER]
+        members.append((f"{name}-PTH.drl", drill_file(eda, drill_hits, rng)))
+        members.append((f"{name}-NPTH.drl", drill_file(eda, max(1, drill_hits // 10), rng)))
+    elif eda == 'altium':
+        members = [(f"{name}.{layer}", gerber_layer(eda, size, rng)) for layer in ALTIUM_COPPER[:layers] + ALTIUM_OTHER]
+        members.append((f"{name}-RoundHoles.TXT", drill_file(eda, drill_hits, rng)))
+        members.append((f"{name}-SlotHoles.TXT", drill_file(eda, max(1, drill_hits // 10), rng)))
+    elif eda == 'lceda':
+        members = [(f"Gerber_{layer}", gerber_layer(eda, size, rng)) for layer in LCEDA_COPPER[:layers] + LCEDA_OTHER]
+        members.append(("Drill_PTH_Through.DRL", drill_file(eda, drill_hits, rng)))
+        members.append(("Drill_NPTH_Through.DRL", drill_file(eda, max(1, drill_hits // 10), rng)))
+    else:
+        raise ValueError(f"Unknown EDA: {eda}")
+    return members + junk_files(junk, min(size, 64 * 1024), rng)
+
+def write_board(path, members):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        for name, data in members:
+            z.writestr(name, data)
+
+def generate(out_dir, edas, boards, layers, size, drill_hits, junk, seed=0):
+    # 每种EDA生成boards个压缩包，返回生成的文件路径列表
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for eda in edas:
+        for index in range(1, boards + 1):
+            name = f"{eda}-board{index:03d}"
+            path = os.path.join(out_dir, f"{name}.zip")
+            write_board(path, board_members(eda, name, layers, size, drill_hits, junk, rng))
+            paths.append(path)
+    return paths
+
+def add_arguments(parser):
+    parser.add_argument('--eda', choices=['kicad', 'altium', 'lceda', 'all'], default='all', help="EDA of the generated archives")
+    parser.add_argument('--boards', type=int, default=5, help="archives per EDA (default: 5)")
+    parser.add_argument('--layers', type=int, choices=[1, 2, 4, 6], default=2, help="copper layers (default: 2)")
+    parser.add_argument('--size-kb', type=int, default=256, help="approximate size of each Gerber layer in KiB (default: 256)")
+    parser.add_argument('--drill-hits', type=int, default=1000, help="hits in the plated drill file (default: 1000)")
+    parser.add_argument('--junk', type=int, default=2, help="extra files that match no rule (default: 2)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed (default: 0)")
+
+def selected_edas(eda):
+    return ['kicad', 'altium', 'lceda'] if eda == 'all' else [eda]
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic KiCad, Altium and LCEDA Gerber archives.")
+    parser.add_argument('out_dir', help="directory for the generated .zip files")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    paths = generate(args.out_dir, selected_edas(args.eda), args.boards, args.layers, args.size_kb * 1024,
+                     args.drill_hits, args.junk, args.seed)
+    total = sum(os.path.getsize(path) for path in paths)
+    print(f"Generated {len(paths)} archives ({total / 1048576:.1f} MiB) in {args.out_dir}")
+
+if __name__ == "__main__":
+    sys.exit(main())
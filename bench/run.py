@@ -0,0 +1,140 @@
+import os
+import sys
+import json
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+# 基准测试直接调用批量模式的转换函数，与实际使用的流程完全一致
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import batch
+import generate
+
+def silence():
+    # 各阶段会把日志打印到终端，测试时丢弃，只保留日志文件
+    sys.stdout = open(os.devnull, 'w')
+
+def convert_all(archives, log_dir, options, jobs):
+    log_paths = [os.path.join(log_dir, f"{index:04d}.log") for index in range(1, len(archives) + 1)]
+    if jobs == 1:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            return [batch.convert_archive(ROOT_DIR, path, log_paths[i], options) for i, path in enumerate(archives)]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=silence) as executor:
+        return list(executor.map(batch.convert_archive, [ROOT_DIR] * len(archives), archives, log_paths, [options] * len(archives)))
+
+def run_once(sources, work_dir, options, jobs):
+    # 每轮使用一份新的输入副本：输出写在输入旁边，LCEDA文件转换后还会删除原文件
+    if os.path.exists(work_dir):
+        shutil.rmtree(work_dir)
+    input_dir = os.path.join(work_dir, 'input')
+    log_dir = os.path.join(work_dir, 'logs')
+    os.makedirs(input_dir)
+    os.makedirs(log_dir)
+    archives = []
+    for source in sources:
+        archives.append(shutil.copy2(source, input_dir))
+
+    start = time.perf_counter()
+    results = convert_all(archives, log_dir, options, jobs)
+    return time.perf_counter() - start, results
+
+def summarize(runs, archive_bytes, gerber_bytes, boards):
+    # 取最快的一轮作为结果，各阶段耗时取所有轮次的平均值
+    wall = min(seconds for seconds, _ in runs)
+    stages = {}
+    for _, results in runs:
+        for result in results:
+            for span in result['spans']:
+                stage = stages.setdefault(span['stage'], {'seconds': 0.0, 'bytes_read': 0, 'bytes_written': 0})
+                stage['seconds'] += span['seconds'] / len(runs)
+                stage['bytes_read'] += span['bytes_read'] // len(runs)
+                stage['bytes_written'] += span['bytes_written'] // len(runs)
+    failed = sum(1 for _, results in runs for result in results if result['status'] == 'Failed')
+    return {
+        'boards': boards,
+        'archive_bytes': archive_bytes,
+        'gerber_bytes': gerber_bytes,
+        'wall_seconds': wall,
+        'runs': [seconds for seconds, _ in runs],
+        'boards_per_second': boards / wall,
+        'archive_mb_per_second': archive_bytes / 1e6 / wall,
+        'gerber_mb_per_second': gerber_bytes / 1e6 / wall,
+        'failed': failed,
+        'stages': stages,
+    }
+
+def format_report(summary, baseline=None):
+    lines = [
+        f"Boards:      {summary['boards']} ({summary['archive_bytes'] / 1e6:.1f} MB zipped, {summary['gerber_bytes'] / 1e6:.1f} MB unzipped)",
+        f"Wall time:   {summary['wall_seconds']:.3f}s (best of {', '.join(f'{s:.3f}' for s in summary['runs'])})",
+        f"Throughput:  {summary['boards_per_second']:.2f} boards/s, {summary['archive_mb_per_second']:.2f} MB/s zipped, "
+        f"{summary['gerber_mb_per_second']:.2f} MB/s unzipped",
+    ]
+    if summary['failed']:
+        lines.append(f"Failed:      {summary['failed']} jobs, see the logs")
+
+    total = sum(stage['seconds'] for stage in summary['stages'].values()) or 1
+    lines.append('')
+    lines.append(f"{'Stage':<16}{'Time(s)':>10}{'Share':>8}{'Read MB':>10}{'Write MB':>10}")
+    for name, stage in sorted(summary['stages'].items(), key=lambda item: -item[1]['seconds']):
+        lines.append(f"{name:<16}{stage['seconds']:>10.3f}{stage['seconds'] / total:>8.1%}"
+                     f"{stage['bytes_read'] / 1e6:>10.2f}{stage['bytes_written'] / 1e6:>10.2f}")
+
+    if baseline:
+        lines.append('')
+        lines.append(f"Baseline:    {baseline['boards_per_second']:.2f} boards/s, "
+                     f"speedup {summary['boards_per_second'] / baseline['boards_per_second']:.2f}x")
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the conversion pipeline on synthetic archives.")
+    generate.add_arguments(parser)
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="archives converted in parallel (default: 1)")
+    parser.add_argument('--stream', action='store_true', help="benchmark the streaming mode")
+    parser.add_argument('--repeat', type=int, default=3, help="number of timed runs, the best one is reported (default: 3)")
+    parser.add_argument('--json', metavar='PATH', help="save the results as JSON, e.g. to use as a baseline later")
+    parser.add_argument('--baseline', metavar='PATH', help="compare against a JSON file written by --json")
+    parser.add_argument('--keep', action='store_true', help="keep the generated archives and logs")
+    args = parser.parse_args()
+
+    # 每轮转换的都是相同的压缩包，关闭结果缓存和层缓存才能测到实际的转换耗时
+    options = {'result_cache': None, 'layer_cache': None}
+    if args.stream:
+        options['stream'] = True
+    bench_dir = tempfile.mkdtemp(prefix='openjlc-bench-')
+    try:
+        sources = generate.generate(os.path.join(bench_dir, 'sources'), generate.selected_edas(args.eda), args.boards,
+                                    args.layers, args.size_kb * 1024, args.drill_hits, args.junk, args.seed)
+        archive_bytes = sum(os.path.getsize(path) for path in sources)
+        gerber_bytes = sum(info.file_size for path in sources for info in zipfile.ZipFile(path).infolist())
+
+        # 先完整运行一轮预热规则缓存，不计入结果
+        run_once(sources, os.path.join(bench_dir, 'warmup'), options, args.jobs)
+        runs = [run_once(sources, os.path.join(bench_dir, f"run{index}"), options, args.jobs) for index in range(args.repeat)]
+
+        summary = summarize(runs, archive_bytes, gerber_bytes, len(sources))
+        summary['options'] = vars(args)
+        baseline = None
+        if args.baseline:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        print(format_report(summary, baseline))
+
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2)
+        if args.keep:
+            print(f"Archives and logs kept in {bench_dir}")
+        return 1 if summary['failed'] else 0
+    finally:
+        if not args.keep:
+            shutil.rmtree(bench_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import os
+import sys
+import shutil
+import zipfile
+import time
+import argparse
+
+# 各阶段脚本位于workspace目录，在同一个解释器内以函数方式调用
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'workspace'))
+
+import init
+import unzip
+import todo
+import identification
+import target
+import convert
+import skip
+import package
+import clear
+import stream
+import yamlio
+import metrics
+import results
+import layers
+from spans import run_stage, stage_span, count, write_job_trace
+from context import new_isolated_job, remove_workspace, new_log_path
+from joblog import log_message, close_log
+
+def write_package(job, zip_file_path):
+    log_file_path = job['log_file_path']
+    log_message(f"ZIP file path: {zip_file_path}", log_file_path)
+
+    # 生成package.yaml报告，尽可能提前执行
+    package_report_path = job['package_yaml']
+
+    # 删除旧的package.yaml文件（如果存在）
+    if os.path.exists(package_report_path):
+        try:
+            os.remove(package_report_path)
+            log_message(f"Deleted old package report: {package_report_path}", log_file_path)
+        except Exception as e:
+            log_message(f"Error deleting old package report: {e}", log_file_path, 'ERROR')
+            sys.exit(1)
+
+    # 定义报告内容
+    job['package'] = {
+        'original': os.path.dirname(zip_file_path).replace("\\", "/") + "/",
+        'name': os.path.basename(zip_file_path),  # 使用.zip文件的原始名称
+        'logs': log_file_path  # 将日志文件路径添加到package.yaml
+    }
+
+    # 写入package.yaml，便于单独运行某个阶段脚本时恢复上下文
+    try:
+        with open(package_report_path, 'w', encoding='utf-8') as report_file:
+            yamlio.dump(job['package'], report_file)
+        log_message(f"Package report generated at {package_report_path}", log_file_path)
+    except Exception as e:
+        log_message(f"Error generating package report: {e}", log_file_path, 'ERROR')
+        sys.exit(1)
+
+    return True
+
+def prepare(job, zip_file_path):
+    log_file_path = job['log_file_path']
+
+    if not write_package(job, zip_file_path):
+        return False
+
+    # 定义Gerber目录
+    gerber_dir = job['gerber_dir']
+
+    # 确保目标文件夹存在
+    if not os.path.exists(gerber_dir):
+        os.makedirs(gerber_dir)
+    log_message(f"Gerber directory: {gerber_dir}", log_file_path)
+
+    # 清空Gerber目录中的所有文件
+    try:
+        for filename in os.listdir(gerber_dir):
+            file_path = os.path.join(gerber_dir, filename)
+            if os.path.isfile(file_path) or os.path.islink(file_path):
+                os.unlink(file_path)  # 删除文件或符号链接
+            elif os.path.isdir(file_path):
+                shutil.rmtree(file_path)  # 删除目录
+        log_message(f"Cleared Gerber directory: {gerber_dir}", log_file_path)
+    except Exception as e:
+        log_message(f"Error clearing Gerber directory: {e}", log_file_path, 'ERROR')
+        sys.exit(1)
+
+    # 复制选中的.zip文件到Gerber目录
+    destination = os.path.join(gerber_dir, os.path.basename(zip_file_path))
+    try:
+        shutil.copy2(zip_file_path, destination)
+        size = os.path.getsize(destination)
+        count(job, bytes_read=size, bytes_written=size, files_read=1, files_written=1)
+        log_message(f"Copied {zip_file_path} to {destination}", log_file_path)
+    except Exception as e:
+        log_message(f"Error copying file: {e}", log_file_path, 'ERROR')
+        sys.exit(1)
+
+    return True
+
+def run_job(job, zip_file_path):
+    # 无论成功与否，结束后都清理该任务的临时工作区
+    start = time.perf_counter()
+    input_bytes = os.path.getsize(zip_file_path) if os.path.exists(zip_file_path) else 0
+    ok = False
+    try:
+        if job['result_cache'] and run_cached(job, zip_file_path):
+            ok = True
+            return ok
+        if job['stream']:
+            ok = run_streaming(job, zip_file_path)
+        else:
+            ok = run_stages(job, zip_file_path)
+        if ok and job['output'] and job['layer_plan']:
+            run_stage(job, 'layer_store', layers.store)
+        if ok and job['output'] and job['result_cache']:
+            run_stage(job, 'cache_store', results.store, zip_file_path)
+        return ok
+    finally:
+        try:
+            export_job(job, ok, time.perf_counter() - start, input_bytes)
+        finally:
+            remove_workspace(job)
+
+def export_job(job, ok, seconds, input_bytes):
+    # trace和指标只用于观察，写入失败时记录日志，不影响转换结果
+    try:
+        if job['trace']:
+            write_job_trace(job)
+        if job['metrics']:
+            metrics.record(job['metrics'], [metrics.job_sample(job, ok, seconds, input_bytes)])
+    except Exception as e:
+        log_message(f"Error exporting trace or metrics: {e}", job['log_file_path'], 'ERROR')
+
+def run_cached(job, zip_file_path):
+    # 同一个压缩包在配置不变时结果相同，命中结果缓存时直接复制之前生成的输出
+    with stage_span(job, 'cache') as span:
+        entry = results.lookup(job, zip_file_path)
+        if entry is not None:
+            write_package(job, zip_file_path)
+            results.restore(job, entry, zip_file_path)
+            # 与正常流程一致，LCEDA文件打包后删除源文件
+            if job['eda'] == 'LCEDA':
+                skip.remove_original(job)
+        span['ok'] = True
+    return entry is not None
+
+def run_stages(job, zip_file_path):
+    log_file_path = job['log_file_path']
+    log_message(f"Workspace: {job['workspace_dir']}", log_file_path)
+
+    # 每个阶段的耗时和读写量记录到日志旁边的 .spans.jsonl 文件
+    if not run_stage(job, 'copy', prepare, zip_file_path):
+        return False
+
+    if not run_stage(job, 'unzip', unzip.run):
+        return False
+
+    # 检查 PCB下单必读.txt 是否存在
+    pcb_must_read_file = os.path.join(job['gerber_dir'], 'PCB下单必读.txt')
+    if os.path.exists(pcb_must_read_file):
+        log_message("Already LCEDA File.", log_file_path)
+        run_stage(job, 'clear', clear.run)
+        return True
+
+    log_message(f"{pcb_must_read_file} not found, proceeding with todo.py execution.", log_file_path)
+
+    # 依次执行各阶段，任一阶段提前结束则停止后续处理
+    stages = [('init', init.run), ('todo', todo.run), ('identification', identification.run), ('target', target.run)]
+    for name, stage in stages:
+        if not run_stage(job, name, stage):
+            return False
+
+    # LCEDA文件直接原样打包，其余EDA需要转换
+    if job['eda'] == 'LCEDA':
+        stages = [('skip', skip.run), ('package', package.run), ('clear', clear.run)]
+    else:
+        stages = [('convert', convert.run), ('package', package.run), ('clear', clear.run)]
+    for name, stage in stages:
+        if not run_stage(job, name, stage):
+            return False
+
+    return True
+
+def run_streaming(job, zip_file_path):
+    # 流式模式：直接从输入压缩包读取成员并写入输出压缩包，不解压到工作区
+    log_file_path = job['log_file_path']
+    log_message(f"Workspace: {job['workspace_dir']}", log_file_path)
+
+    if not write_package(job, zip_file_path):
+        return False
+
+    with zipfile.ZipFile(zip_file_path, 'r') as source:
+        if 'PCB下单必读.txt' in source.namelist():
+            log_message("Already LCEDA File.", log_file_path)
+            return True
+
+        log_message("PCB下单必读.txt not found in archive, proceeding with streaming conversion.", log_file_path)
+
+        if not run_stage(job, 'init', init.run):
+            return False
+        ok = stream.run(job, source)
+
+    # 与skip阶段一致，LCEDA文件打包后删除源文件（需要先关闭压缩包）
+    if ok and job['eda'] == 'LCEDA':
+        ok = skip.remove_original(job)
+    return ok
+
+def main():
+    # 获取OpenJLC路径
+    openjlc_dir = os.environ.get("OpenJLC")
+    if not openjlc_dir:
+        print("Error: OpenJLC environment variable is not set.")
+        sys.exit(1)
+
+    parser = argparse.ArgumentParser(description="Convert one Gerber .zip archive.")
+    parser.add_argument('zip_file_path', help="path of the .zip archive")
+    parser.add_argument('--stream', action='store_true', help="convert zip-to-zip without extracting to disk")
+    parser.add_argument('--trace', action='store_true', help="write a Chrome trace.json next to the log")
+    parser.add_argument('--profile', action='store_true', help="run every stage under cProfile and save .pstats next to the log")
+    parser.add_argument('--memory', action='store_true', help="record peak memory and top allocation sites of every stage")
+    parser.add_argument('--metrics', metavar='PATH', help="accumulate Prometheus metrics into this textfile")
+    parser.add_argument('--no-result-cache', action='store_true', help="always convert, even if the same archive was converted before")
+    parser.add_argument('--no-layer-cache', action='store_true', help="reprocess every layer, even if it is unchanged since an earlier revision")
+    args = parser.parse_args()
+
+    # 检查传入的.zip文件路径
+    if not args.zip_file_path.endswith('.zip'):
+        print("Usage: pipeline.py [--stream] [--trace] [--profile] [--memory] [--metrics PATH] [--no-result-cache] [--no-layer-cache] <zip_file_path>")
+        sys.exit(1)
+
+    job = new_isolated_job(openjlc_dir, new_log_path(openjlc_dir))
+    if args.stream:
+        job['stream'] = True
+    if args.trace:
+        job['trace'] = True
+    if args.profile:
+        job['profile'] = True
+    if args.memory:
+        job['memory'] = True
+    if args.metrics:
+        job['metrics'] = args.metrics
+    if args.no_result_cache:
+        job['result_cache'] = None
+    if args.no_layer_cache:
+        job['layer_cache'] = None
+    if not run_job(job, args.zip_file_path):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import os
+import pickle
+import hashlib
+import tempfile
+from contextlib import contextmanager
+
+# 缓存格式变化时修改版本号，旧缓存自动失效
+CACHE_VERSION = 1
+
+def cache_dir(openjlc_dir):
+    return os.path.join(openjlc_dir, 'cache')
+
+def file_stamp(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def cache_path(openjlc_dir, path):
+    # 每个源文件对应一个缓存文件，文件名由源文件的绝对路径决定
+    name = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir(openjlc_dir), f"{name}.pickle")
+
+@contextmanager
+def atomic_write(path, mode='wb'):
+    # 先写同一目录下的临时文件，完成后再改名，其他进程不会读到写了一半的文件；失败时删除临时文件
+    fd, partial_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.part')
+    try:
+        with os.fdopen(fd, mode, encoding=None if 'b' in mode else 'utf-8') as f:
+            yield f
+        os.replace(partial_path, path)
+    except BaseException:
+        try:
+            os.remove(partial_path)
+        except OSError:
+            pass
+        raise
+
+def evict_lru(directory, suffix, limit, companions=()):
+    # 以suffix结尾的文件为缓存条目，总大小超过上限时从最久未使用（修改时间最早）的条目开始删除
+    # companions为同名的附属文件后缀（例如 .json），随条目一起删除；返回被删除的条目路径
+    entries = []
+    for name in os.listdir(directory):
+        if not name.endswith(suffix):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    evicted = []
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        stem = path[:-len(suffix)]
+        for stale_path in [path] + [stem + companion for companion in companions]:
+            try:
+                os.remove(stale_path)
+            except OSError:
+                pass
+        total -= size
+        evicted.append(path)
+    return evicted
+
+def read_entry(entry_path):
+    try:
+        with open(entry_path, 'rb') as f:
+            entry = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(entry, dict) or entry.get('version') != CACHE_VERSION:
+        return None
+    return entry
+
+def write_entry(entry_path, entry):
+    try:
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        with atomic_write(entry_path) as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        # 缓存只是加速，写入失败时不影响转换
+        pass
+
+def load_cached(openjlc_dir, path, parse):
+    # 返回parse(文件)的结果，文件未变化时直接读取缓存
+    # 修改时间和大小一致时不再读取源文件；不一致时比较sha256，内容相同只更新时间戳
+    stamp = file_stamp(path)
+    entry_path = cache_path(openjlc_dir, path)
+    entry = read_entry(entry_path)
+    if entry is not None and entry['stamp'] == stamp:
+        return entry['data']
+
+    digest = file_hash(path)
+    if entry is not None and entry['sha256'] == digest:
+        entry['stamp'] = stamp
+        write_entry(entry_path, entry)
+        return entry['data']
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = parse(f)
+    write_entry(entry_path, {
+        'version': CACHE_VERSION,
+        'path': os.path.abspath(path),
+        'stamp': stamp,
+        'sha256': digest,
+        'data': data,
+    })
+    return data
@@ -1,16 +1,7 @@
 import os
 import shutil
-import sys
-from datetime import datetime
-import yaml
-
-def log_message(message, log_file_path):
-    current_time = datetime.now().strftime('%H:%M:%S')
-    log_entry = f"{current_time} {message}"
-    print(log_entry)  # 输出到终端
-    with open(log_file_path, 'a', encoding='utf-8') as log_file:
-        log_file.write(log_entry + '\n')
-        log_file.flush()  # 确保每次写入后立即刷新
+from context import load_job
+from joblog import log_message
 
 def clear_directory(directory, log_file_path):
     try:
@@ -25,37 +16,18 @@ def clear_directory(directory, log_file_path):
         else:
             log_message(f"Directory does not exist: {directory}", log_file_path)
     except Exception as e:
-        log_message(f"Error clearing directory {directory}: {e}", log_file_path)
-
-def main():
-    # 获取OpenJLC路径
-    openjlc_dir = os.environ.get("OpenJLC")
-    if not openjlc_dir:
-        print("Error: OpenJLC environment variable is not set.")
-        sys.exit(1)
-
-    # 读取package.yaml文件中的日志文件路径
-    package_yaml_path = os.path.join(openjlc_dir, 'workspace', 'package.yaml')
-    if not os.path.exists(package_yaml_path):
-        print("Error: package.yaml not found.")
-        sys.exit(1)
-
-    with open(package_yaml_path, 'r', encoding='utf-8') as package_file:
-        package_data = yaml.safe_load(package_file)
-        log_filename = package_data.get('logs')
-        if not log_filename:
-            print("Error: 'logs' field not found in package.yaml.")
-            sys.exit(1)
+        log_message(f"Error clearing directory {directory}: {e}", log_file_path, 'ERROR')
 
-    # 设置日志文件路径
-    log_file_path = os.path.join(openjlc_dir, 'logs', log_filename)
+def run(job):
+    log_file_path = job['log_file_path']
+    package_yaml_path = job['package_yaml']
 
     # 记录clear.py日志开始
     log_message("[clear.py] XC Logs start collecting.", log_file_path)
 
     # 定义需要清理的目录
-    gerber_dir = os.path.join(openjlc_dir, 'workspace', 'Gerber')
-    workflow_dir = os.path.join(openjlc_dir, 'workspace', 'workflow')
+    gerber_dir = job['gerber_dir']
+    workflow_dir = job['workflow_dir']
 
     # 清理Gerber和workflow目录
     clear_directory(gerber_dir, log_file_path)
@@ -64,6 +36,14 @@ def main():
     # 记录清理操作完成日志
     log_message("[clear.py] XC Logs done.", log_file_path)
 
+    # 清理保留的输入压缩包
+    if os.path.exists(job['source_zip']):
+        try:
+            os.remove(job['source_zip'])
+            log_message(f"Deleted {job['source_zip']}", log_file_path)
+        except Exception as e:
+            log_message(f"Error deleting {job['source_zip']}: {e}", log_file_path, 'ERROR')
+
     # 清理残留的package信息
     try:
         os.remove(package_yaml_path)
@@ -71,7 +51,12 @@ def main():
     except FileNotFoundError:
         log_message(f"{package_yaml_path} not found, no deletion necessary.", log_file_path)
     except Exception as e:
-        log_message(f"Error deleting {package_yaml_path}: {e}", log_file_path)
+        log_message(f"Error deleting {package_yaml_path}: {e}", log_file_path, 'ERROR')
+
+    return True
+
+def main():
+    run(load_job())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,107 @@
+import os
+import sys
+import shutil
+import tempfile
+import yamlio
+from datetime import datetime
+
+def new_job(openjlc_dir, log_file_path, workspace_dir=None):
+    # 一次转换任务的共享上下文，各阶段之间直接传递，不再各自重新读取package.yaml
+    isolated = workspace_dir is not None
+    if not isolated:
+        workspace_dir = os.path.join(openjlc_dir, 'workspace')
+
+    # 独立工作区中Header和PCB下单必读.txt也按任务生成，避免并行任务互相覆盖
+    if isolated:
+        header_yaml = os.path.join(workspace_dir, 'Header.yaml')
+        output_dir = os.path.join(workspace_dir, 'output')
+    else:
+        header_yaml = os.path.join(openjlc_dir, 'config', 'Header.yaml')
+        output_dir = os.path.join(openjlc_dir, 'output')
+
+    # 结果缓存默认放在 cache/results，OPENJLC_RESULT_CACHE 可以指定其他目录，设为0时关闭
+    result_cache = os.environ.get('OPENJLC_RESULT_CACHE', os.path.join(openjlc_dir, 'cache', 'results'))
+    # 层缓存默认放在 cache/layers，OPENJLC_LAYER_CACHE 可以指定其他目录，设为0时关闭
+    layer_cache = os.environ.get('OPENJLC_LAYER_CACHE', os.path.join(openjlc_dir, 'cache', 'layers'))
+
+    return {
+        'openjlc_dir': openjlc_dir,
+        'workspace_dir': workspace_dir,
+        'isolated': isolated,
+        'gerber_dir': os.path.join(workspace_dir, 'Gerber'),
+        'workflow_dir': os.path.join(workspace_dir, 'workflow'),
+        'package_yaml': os.path.join(workspace_dir, 'package.yaml'),
+        'target_yaml': os.path.join(workspace_dir, 'target.yaml'),
+        'report_yaml': os.path.join(workspace_dir, 'report.yaml'),
+        'config_yaml': os.path.join(workspace_dir, 'config.yaml'),
+        'source_zip': os.path.join(workspace_dir, 'source.zip'),
+        'header_yaml': header_yaml,
+        'output_dir': output_dir,
+        'log_file_path': log_file_path,
+        'package': {},
+        'eda': None,
+        'source': None,
+        'layers': None,
+        'output': None,
+        # 流式模式不解压到工作区，也可以通过环境变量 OPENJLC_STREAM=1 打开
+        'stream': os.environ.get('OPENJLC_STREAM') == '1',
+        # 当前阶段的span和已经结束的全部span，见spans.py
+        'span': None,
+        'spans': [],
+        # 打开后额外导出Chrome Trace格式的trace.json，也可以通过环境变量 OPENJLC_TRACE=1 打开
+        'trace': os.environ.get('OPENJLC_TRACE') == '1',
+        'trace_events': [],
+        # 打开后每个阶段都在cProfile下运行，也可以通过环境变量 OPENJLC_PROFILE=1 打开
+        'profile': os.environ.get('OPENJLC_PROFILE') == '1',
+        # 打开后记录每个阶段的内存峰值和分配位置，也可以通过环境变量 OPENJLC_MEMORY=1 打开
+        'memory': os.environ.get('OPENJLC_MEMORY') == '1',
+        # Prometheus textfile的路径，任务结束时累加指标，也可以通过环境变量 OPENJLC_METRICS 指定
+        'metrics': os.environ.get('OPENJLC_METRICS') or None,
+        'result_cache': None if result_cache in ('', '0') else result_cache,
+        'result_key': None,
+        'layer_cache': None if layer_cache in ('', '0') else layer_cache,
+        'layer_plan': None,
+        'x2_layers': {},
+    }
+
+def new_isolated_job(openjlc_dir, log_file_path):
+    # 每个任务使用独立的临时工作区和一份config.yaml副本，多个任务可以同时运行
+    workspace_dir = tempfile.mkdtemp(prefix='openjlc-')
+    job = new_job(openjlc_dir, log_file_path, workspace_dir)
+    shutil.copy2(os.path.join(openjlc_dir, 'workspace', 'config.yaml'), job['config_yaml'])
+    return job
+
+def remove_workspace(job):
+    # 只删除临时工作区，共享的workspace目录保持原样
+    if job['isolated']:
+        shutil.rmtree(job['workspace_dir'], ignore_errors=True)
+
+def new_log_path(openjlc_dir, suffix=''):
+    # 日志文件名精确到秒并带上进程号，同时运行的任务不会写进同一个日志
+    logs_dir = os.path.join(openjlc_dir, 'logs')
+    os.makedirs(logs_dir, exist_ok=True)
+    log_filename = f"{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}-{os.getpid()}{suffix}.log"
+    return os.path.join(logs_dir, log_filename)
+
+def load_job():
+    # 单独运行某个阶段脚本时，从环境变量和package.yaml恢复任务上下文
+    openjlc_dir = os.environ.get("OpenJLC")
+    if not openjlc_dir:
+        print("Error: OpenJLC environment variable is not set.")
+        sys.exit(1)
+
+    package_yaml_path = os.path.join(openjlc_dir, 'workspace', 'package.yaml')
+    if not os.path.exists(package_yaml_path):
+        print("Error: package.yaml not found.")
+        sys.exit(1)
+
+    with open(package_yaml_path, 'r', encoding='utf-8') as package_file:
+        package_data = yamlio.load(package_file)
+        log_filename = package_data.get('logs')
+        if not log_filename:
+            print("Error: 'logs' field not found in package.yaml.")
+            sys.exit(1)
+
+    job = new_job(openjlc_dir, os.path.join(openjlc_dir, 'logs', log_filename))
+    job['package'] = package_data
+    return job
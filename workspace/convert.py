@@ -1,79 +1,54 @@
-import yaml
+import yamlio
 import os
-import re
 import shutil
+import zipfile
 from datetime import datetime
-import subprocess
 import sys  # 添加此行以导入 sys 模块
+from context import load_job
+from rules import compile_rules, classify
+from cache import load_cached
+from spans import count, file_span
+from joblog import log_message
+import layers
 
-def log_message(message, log_file_path):
-    current_time = datetime.now().strftime('%H:%M:%S')
-    log_entry = f"{current_time} {message}"
-    print(log_entry)  # 输出到终端
-    with open(log_file_path, 'a', encoding='utf-8') as log_file:
-        log_file.write(log_entry + '\n')
-        log_file.flush()  # 确保每次写入后立即刷新
+# 分块复制时每次读取的字节数
+COPY_CHUNK_SIZE = 1024 * 1024
 
-def main():
-    # 获取OpenJLC路径
-    openjlc_dir = os.environ.get("OpenJLC")
-    if not openjlc_dir:
-        print("Error: OpenJLC environment variable is not set.")
-        sys.exit(1)
-
-    # 读取package.yaml文件中的日志文件路径
-    package_yaml_path = os.path.join(openjlc_dir, 'workspace', 'package.yaml')
-    if not os.path.exists(package_yaml_path):
-        print("Error: package.yaml not found.")
-        sys.exit(1)
-
-    with open(package_yaml_path, 'r', encoding='utf-8') as package_file:
-        package_data = yaml.safe_load(package_file)
-        log_filename = package_data.get('logs')
-        if not log_filename:
-            print("Error: 'logs' field not found in package.yaml.")
-            sys.exit(1)
-
-    # 设置日志文件路径
-    log_file_path = os.path.join(openjlc_dir, 'logs', log_filename)
-
-    # 记录convert.py日志开始
-    log_message("[convert.py] XC Logs start collecting.", log_file_path)
-
-    # 设置工作目录和目标目录
-    WorkDir = os.path.join(openjlc_dir, 'workspace', 'Gerber')
-    DestDir = os.path.join(openjlc_dir, 'workspace', 'workflow')
+def load_rules(job):
+    # 加载config.yaml、Header.yaml以及对应EDA的规则文件，返回 (Config, HeaderConfig, Rule, rule_type)
+    openjlc_dir = job['openjlc_dir']
+    log_file_path = job['log_file_path']
 
     # 固定读取config.yaml的路径
-    config_file = os.path.join(openjlc_dir, "workspace", "config.yaml")
+    config_file = job['config_yaml']
     log_message(f"Config file path: {config_file}", log_file_path)
 
     # 加载配置文件
     try:
         with open(config_file, "r", encoding="utf-8") as fconfig:
-            Config = yaml.load(fconfig, Loader=yaml.FullLoader)
+            Config = yamlio.load(fconfig)
             log_message("Config file loaded successfully.", log_file_path)
     except FileNotFoundError as e:
-        log_message(f"Failed to load config file: {e}", log_file_path)
+        log_message(f"Failed to load config file: {e}", log_file_path, 'ERROR')
         sys.exit(1)
     except Exception as e:
-        log_message(f"Error while loading config file: {e}", log_file_path)
+        log_message(f"Error while loading config file: {e}", log_file_path, 'ERROR')
         sys.exit(1)
 
     # 从固定路径读取Header
-    header_file = os.path.join(openjlc_dir, "config", "Header.yaml")
+    header_file = job['header_yaml']
     log_message(f"Header file path: {header_file}", log_file_path)
 
     # 加载Header文件
     try:
         with open(header_file, "r", encoding="utf-8") as fheader:
-            HeaderConfig = yaml.load(fheader, Loader=yaml.FullLoader)
+            HeaderConfig = yamlio.load(fheader)
             log_message("Header file loaded successfully.", log_file_path)
     except FileNotFoundError as e:
-        log_message(f"Failed to load header file: {e}", log_file_path)
+        log_message(f"Failed to load header file: {e}", log_file_path, 'ERROR')
         sys.exit(1)
     except Exception as e:
-        log_message(f"Error while loading header file: {e}", log_file_path)
+        log_message(f"Error while loading header file: {e}", log_file_path, 'ERROR')
         sys.exit(1)
 
     # 从配置文件中获取规则类型和边缘类型
@@ -85,7 +60,7 @@ def main():
     log_message(f"Edge type: {edge_type}", log_file_path)
 
     if not rule_type or not edge_type:
-        log_message("Error: Rule type or Edge type is not defined in config.yaml", log_file_path)
+        log_message("Error: Rule type or Edge type is not defined in config.yaml", log_file_path, 'ERROR')
         sys.exit(1)
 
     # 根据Rule类型加载对应的规则文件
@@ -94,21 +69,21 @@ def main():
     elif rule_type == "KiCAD":
         rule_file = os.path.join(openjlc_dir, "rule", "rule_kicad.yaml")
     else:
-        log_message(f"Error: Unknown Rule type '{rule_type}' in config.yaml", log_file_path)
+        log_message(f"Error: Unknown Rule type '{rule_type}' in config.yaml", log_file_path, 'ERROR')
         sys.exit(1)
 
     log_message(f"Rule file path: {rule_file}", log_file_path)
 
     # 加载规则文件
     try:
-        with open(rule_file, "r", encoding="utf-8") as frule:
-            Rule = yaml.load(frule, Loader=yaml.FullLoader)
-            log_message("Rule file loaded successfully.", log_file_path)
+        # 规则文件未变化时直接使用缓存中解析好的结果
+        Rule = load_cached(openjlc_dir, rule_file, yamlio.load)
+        log_message("Rule file loaded successfully.", log_file_path)
     except FileNotFoundError as e:
-        log_message(f"Failed to load rule file: {e}", log_file_path)
+        log_message(f"Failed to load rule file: {e}", log_file_path, 'ERROR')
         sys.exit(1)
     except Exception as e:
-        log_message(f"Error while loading rule file: {e}", log_file_path)
+        log_message(f"Error while loading rule file: {e}", log_file_path, 'ERROR')
         sys.exit(1)
 
     # 根据Edge类型选择正确的Outline规则
@@ -117,7 +92,7 @@ def main():
         Rule["Outline"] = Rule[outline_key]
         log_message(f"Using Outline rule: {outline_key}", log_file_path)
     else:
-        log_message(f"Error: Outline rule for Edge '{edge_type}' not found in {rule_file}", log_file_path)
+        log_message(f"Error: Outline rule for Edge '{edge_type}' not found in {rule_file}", log_file_path, 'ERROR')
         sys.exit(1)
 
     # 移除其他可能的Outline规则，只保留选中的
@@ -133,99 +108,155 @@ def main():
         else:
             log_message(f"Config key '{key}' found.", log_file_path)
 
-    # 清空目标目录
-    if os.path.exists(DestDir):
-        try:
-            shutil.rmtree(DestDir)
-            log_message(f"Cleared destination directory: {DestDir}", log_file_path)
-        except Exception as e:
-            log_message(f"Error clearing destination directory: {e}", log_file_path)
-            sys.exit(1)
-
-    # 重新创建目标目录
-    os.makedirs(DestDir)
-    log_message(f"Created destination directory: {DestDir}", log_file_path)
+    return Config, HeaderConfig, Rule, rule_type
 
+def new_report(rule_type, Rule):
     # 创建报告字典
-    report = {
+    return {
         "Source": rule_type,
         "Date": datetime.now().strftime("%Y-%m-%d"),
         "Time": datetime.now().strftime("%H:%M:%S"),
         "Edge": "Yes" if Rule.get("Outline") else "No"
     }
 
-    # 检验文件是否齐全/重复匹配
-    for key, value in Rule.items():
-        matchFile = []
-        rePattern = re.compile(pattern=value, flags=re.IGNORECASE)  # 添加忽略大小写
-
-        log_message(f"Searching for files matching rule '{key}'...", log_file_path)
-
-        for fileName in os.listdir(WorkDir):
-            if rePattern.search(fileName):
-                matchFile.append(fileName)
-
+def x2_keys(matcher, Rule, fileName, candidates):
+    # identification阶段按X2属性给出的候选规则只有一条时直接使用，不再匹配文件名
+    # 有多条候选时（例如PTH和PTH_Via），在文件名匹配到的规则中选择，都没有匹配时取第一条
+    candidates = [key for key in candidates if key in Rule]
+    if len(candidates) == 1:
+        return candidates
+    keys = classify(matcher, fileName)
+    if candidates:
+        return [key for key in keys if key in candidates] or candidates[:1]
+    return keys
+
+def classify_files(Rule, file_names, job=None):
+    # 只遍历一次文件列表，建立 文件 -> 匹配到的规则 的索引，每个文件名只做一次正则匹配
+    matcher = compile_rules(Rule)
+    x2_layers = job['x2_layers'] if job else {}
+    index = {}
+    for fileName in file_names:
+        with file_span(job, fileName, 'classify'):
+            if fileName in x2_layers:
+                keys = x2_keys(matcher, Rule, fileName, x2_layers[fileName])
+            else:
+                keys = classify(matcher, fileName)
+        if keys:
+            index[fileName] = keys
+    return index
+
+def check_rules(Rule, file_names, report, log_file_path, job=None):
+    # 检验文件是否齐全/重复匹配，返回每条规则唯一匹配到的文件
+    index = classify_files(Rule, file_names, job)
+    matchFiles = {key: [] for key in Rule}
+    for fileName, keys in index.items():
+        for key in keys:
+            matchFiles[key].append(fileName)
+
+    matches = {}
+    conflicts = []
+    for key, matchFile in matchFiles.items():
         if len(matchFile) < 1:
-            log_message(f"{key} match failed, skipping this file.", log_file_path)
+            log_message(f"{key} match failed, skipping this file.", log_file_path, 'WARNING')
             report[key] = "No"
             continue
         elif len(matchFile) > 1:
-            raise Exception(f"{key} multiple matches found: {', '.join(matchFile)}")
+            conflicts.append(f"{key} multiple matches found: {', '.join(matchFile)}")
         else:
             log_message(f"{key} -> {matchFile[0]}", log_file_path)
             report[key] = "Yes"
+            matches[key] = matchFile[0]
+
+    # 所有重复匹配的规则一次性报告
+    if conflicts:
+        for conflict in conflicts:
+            log_message(conflict, log_file_path, 'ERROR')
+        raise Exception('; '.join(conflicts))
+    return matches
+
+def write_report(report, report_file_path, log_file_path):
+    # 将报告写入 report.yaml 文件
+    try:
+        with open(report_file_path, "w", encoding="utf-8") as report_file:
+            yamlio.dump(report, report_file)
+        log_message(f"Report generated successfully at {report_file_path}", log_file_path)
+    except Exception as e:
+        log_message(f"Error generating report: {e}", log_file_path, 'ERROR')
 
-    # 改名和加头操作
-    for key, value in Rule.items():
-        rePattern = re.compile(pattern=value, flags=re.IGNORECASE)
-        matchFile = ""
+def write_layer(source_path, dest_file_path, header):
+    # 先写Header，再按固定大小分块复制原文件，内存占用与文件大小无关
+    with open(source_path, "rb") as src, open(dest_file_path, "wb") as dst:
+        dst.write(header)
+        shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
 
-        for fileName in os.listdir(WorkDir):
-            if rePattern.search(fileName):
-                matchFile = fileName
-                break
+def run(job):
+    log_file_path = job['log_file_path']
 
-        if matchFile:
+    # 记录convert.py日志开始
+    log_message("[convert.py] XC Logs start collecting.", log_file_path)
+
+    # 设置工作目录和目标目录
+    WorkDir = job['gerber_dir']
+    DestDir = job['workflow_dir']
+
+    Config, HeaderConfig, Rule, rule_type = load_rules(job)
+
+    # 清空目标目录
+    if os.path.exists(DestDir):
+        try:
+            shutil.rmtree(DestDir)
+            log_message(f"Cleared destination directory: {DestDir}", log_file_path)
+        except Exception as e:
+            log_message(f"Error clearing destination directory: {e}", log_file_path, 'ERROR')
+            sys.exit(1)
+
+    # 重新创建目标目录
+    os.makedirs(DestDir)
+    log_message(f"Created destination directory: {DestDir}", log_file_path)
+
+    report = new_report(rule_type, Rule)
+    # 目录只列出一次，校验和写入都使用同一份索引
+    matches = check_rules(Rule, os.listdir(WorkDir), report, log_file_path, job)
+
+    # 改名和加头操作，Header只编码一次
+    header = HeaderConfig["Header"].encode("utf-8")  # 使用从Header.yaml加载的Header
+
+    # 输入压缩包保留在工作区时，按成员的CRC32查找层缓存，命中的层在打包时直接拼接
+    hits = {}
+    if job['layer_cache'] and os.path.exists(job['source_zip']):
+        with zipfile.ZipFile(job['source_zip'], 'r') as source:
+            job['layer_plan'] = layers.plan(job, source, matches, Config, header)
+        header = job['layer_plan']['header']
+        hits = job['layer_plan']['hits']
+
+    for key in Rule:
+        matchFile = matches.get(key)
+
+        if matchFile and Config["FileName"][key] in hits:
+            log_message(f"Layer '{matchFile}' unchanged, using cached '{Config['FileName'][key]}'", log_file_path)
+        elif matchFile:
             dest_file_path = os.path.join(DestDir, Config["FileName"][key])
             try:
-                with open(os.path.join(WorkDir, matchFile), "r") as file:
-                    fileData = file.read()
-                with open(dest_file_path, "w", encoding="utf-8") as file:
-                    file.write(HeaderConfig["Header"])  # 使用从Header.yaml加载的Header
-                    file.write(fileData)
+                with file_span(job, matchFile, 'header'):
+                    write_layer(os.path.join(WorkDir, matchFile), dest_file_path, header)
+                size = os.path.getsize(dest_file_path)
+                count(job, bytes_read=size - len(header), bytes_written=size, files_read=1, files_written=1)
                 log_message(f"Processed file '{matchFile}' and saved to '{dest_file_path}'", log_file_path)
             except Exception as e:
-                log_message(f"Error processing file '{matchFile}': {e}", log_file_path)
+                log_message(f"Error processing file '{matchFile}': {e}", log_file_path, 'ERROR')
                 sys.exit(1)
         else:
-            log_message(f"File matching rule '{key}' not found.", log_file_path)
+            log_message(f"File matching rule '{key}' not found.", log_file_path, 'WARNING')
             report[key] = "No"
 
-    # 将报告写入 report.yaml 文件
-    report_file_path = os.path.join(openjlc_dir, "workspace", "report.yaml")
-    try:
-        with open(report_file_path, "w", encoding="utf-8") as report_file:
-            yaml.dump(report, report_file, default_flow_style=False, allow_unicode=True)
-        log_message(f"Report generated successfully at {report_file_path}", log_file_path)
-    except Exception as e:
-        log_message(f"Error generating report: {e}", log_file_path)
+    write_report(report, job['report_yaml'], log_file_path)
 
     # 记录convert.py日志结束
     log_message("[convert.py] XC Logs done.", log_file_path)
-    sys.stdout = sys.__stdout__  # 恢复标准输出
+    return True
 
-    # 执行package.py
-    package_script = os.path.join(openjlc_dir, 'workspace', 'package.py')
-    if os.path.exists(package_script):
-        try:
-            subprocess.run(['python', package_script], check=True)
-            print(f"Package script executed successfully.")
-        except subprocess.CalledProcessError as e:
-            print(f"Error executing package script: {e}")
-            sys.exit(1)
-    else:
-        print(f"Error: {package_script} not found.")
-        sys.exit(1)
+def main():
+    run(load_job())
 
 if __name__ == "__main__":
     main()
@@ -1,55 +1,107 @@
 import os
 import re
-import yaml
-import subprocess
-import sys  # 添加导入sys模块
-from datetime import datetime
-
-def log_message(message, log_file_path):
-    current_time = datetime.now().strftime('%H:%M:%S')
-    log_entry = f"{current_time} {message}"
-    print(log_entry)  # 输出到终端
-    with open(log_file_path, 'a', encoding='utf-8') as log_file:
-        log_file.write(log_entry + '\n')
-        log_file.flush()  # 确保每次写入后立即刷新
-
-def main():
-    # 获取OpenJLC路径
-    openjlc_dir = os.environ.get("OpenJLC")
-    if not openjlc_dir:
-        print("Error: OpenJLC environment variable is not set.")
-        return
-
-    # 读取package.yaml文件中的日志文件路径
-    package_yaml_path = os.path.join(openjlc_dir, 'workspace', 'package.yaml')
-    if not os.path.exists(package_yaml_path):
-        print("Error: package.yaml not found.")
-        return
-
-    with open(package_yaml_path, 'r', encoding='utf-8') as package_file:
-        package_data = yaml.safe_load(package_file)
-        log_filename = package_data.get('logs')
-        if not log_filename:
-            print("Error: 'logs' field not found in package.yaml.")
-            return
-
-    # 设置日志文件路径
-    log_file_path = os.path.join(openjlc_dir, 'logs', log_filename)
+import yamlio
+from concurrent.futures import ThreadPoolExecutor
+from context import load_job
+from cache import load_cached
+from spans import count, file_span
+from joblog import log_message
+import x2
+
+# EDA在文件头中留下的标记，按顺序匹配
+EDA_FINGERPRINTS = [
+    (b'Altium', 'Altium_Designer'),
+    (b'KiCad', 'KiCAD'),
+    (b'EasyEDA', 'LCEDA'),
+]
+# identification.yaml未指定IdentificationFile时使用的板框文件规则
+DEFAULT_IDENTIFICATION_FILE = r'(?i)(\.gm1|\.gko|\.gm13|Edge_Cuts|-Edge_Cuts)'
+# 每个文件只读取开头的固定字节数，EDA的标记都在文件头的注释中
+SNIFF_BYTES = int(os.environ.get('OPENJLC_SNIFF_BYTES', '4096'))
+SNIFF_WORKERS = 8
+
+# 只由X2属性找到板框文件时，各EDA默认的板框类型（对应target.py中的Edge映射）
+X2_EDGE = {
+    'KiCAD': 'Edge_Cuts',
+    'Altium_Designer': 'GKO',
+    'LCEDA': 'GKO',
+}
+
+def detect_eda(head):
+    for fingerprint, eda_tool in EDA_FINGERPRINTS:
+        if fingerprint in head:
+            return eda_tool
+    return None
+
+def sniff_head(head):
+    # 优先使用Gerber X2的GenerationSoftware和FileFunction属性，没有属性时按文件头中的标记识别EDA
+    attributes, file_format = x2.parse(head)
+    return x2.software_eda(attributes) or detect_eda(head), x2.layer_keys(attributes, file_format)
+
+def sniff(file_paths, open_file, job=None):
+    # 在线程池中并发读取所有文件的开头
+    # 返回 (文件 -> 识别到的EDA（未识别为None）, 文件 -> X2属性给出的候选规则名, 读取的总字节数)
+    def read_prefix(file_path):
+        with file_span(job, os.path.basename(file_path), 'sniff'), open_file(file_path) as f:
+            return f.read(SNIFF_BYTES)
+
+    if not file_paths:
+        return {}, {}, 0
+    with ThreadPoolExecutor(max_workers=min(SNIFF_WORKERS, len(file_paths))) as executor:
+        heads = list(executor.map(read_prefix, file_paths))
+    results = {}
+    layers = {}
+    for file_path, head in zip(file_paths, heads):
+        results[file_path], keys = sniff_head(head)
+        if keys:
+            layers[file_path] = keys
+    return results, layers, sum(len(head) for head in heads)
+
+def member_name(job, file_path, open_file):
+    # 与convert、skip中使用的文件名一致：Gerber目录下的相对路径，或者压缩包内的成员名
+    if open_file is not None:
+        return file_path
+    return os.path.relpath(file_path, job['gerber_dir']).replace(os.sep, '/')
+
+def vote_eda(results, found_file):
+    # 每个文件投一票，得票最多的EDA胜出；票数相同时以板框文件的结果为准，其次按EDA_FINGERPRINTS的顺序
+    votes = {}
+    for eda_tool in results.values():
+        if eda_tool:
+            votes[eda_tool] = votes.get(eda_tool, 0) + 1
+    if not votes:
+        return None, votes
+    order = [eda_tool for _, eda_tool in EDA_FINGERPRINTS]
+    preferred = results.get(found_file)
+    eda_tool = max(votes, key=lambda tool: (votes[tool], tool == preferred, -order.index(tool)))
+    return eda_tool, votes
+
+def list_files(gerber_dir):
+    # 按os.walk的顺序列出Gerber目录下的所有文件
+    file_paths = []
+    for root, dirs, files in os.walk(gerber_dir):
+        for file in files:
+            file_paths.append(os.path.join(root, file))
+    return file_paths
+
+def run(job, file_paths=None, open_file=None):
+    # file_paths和open_file可以由调用方提供，例如直接读取压缩包内的成员
+    openjlc_dir = job['openjlc_dir']
+    log_file_path = job['log_file_path']
 
     # 记录日志开始
     log_message("[identification.py] XC Logs start collecting.", log_file_path)
 
     # 解析identification.yaml文件
     identification_yaml_path = os.path.join(openjlc_dir, 'rule', 'identification.yaml')
-    with open(identification_yaml_path, 'r', encoding='utf-8') as f:
-        identification_config = yaml.safe_load(f)
+    identification_config = load_cached(openjlc_dir, identification_yaml_path, yamlio.load)
     
     target_eda = identification_config.get('TargetEDA', 'Auto')
     edge_config = identification_config.get('Edge', 'Auto')
-    identification_file_pattern = identification_config.get('IdentificationFile', r'(?i)(\.gm1|\.gko|\.gm13|Edge_Cuts|-Edge_Cuts)')
+    identification_file_pattern = identification_config.get('IdentificationFile', DEFAULT_IDENTIFICATION_FILE)
 
     # 定义目标文件路径
-    target_yaml_path = os.path.join(openjlc_dir, 'workspace', 'target.yaml')
+    target_yaml_path = job['target_yaml']
 
     # 处理Edge配置
     if edge_config != 'Auto':
@@ -66,19 +118,27 @@ def main():
                 f.write("#TargetEdge: GM13\n")
             log_message(f"Specified TargetEdge: {edge_config}", log_file_path)
         else:
-            log_message("Invalid Edge configuration specified.", log_file_path)
-            return
+            log_message("Invalid Edge configuration specified.", log_file_path, 'ERROR')
+            return False
     else:
         # Auto模式下，查找文件
-        gerber_dir = os.path.join(openjlc_dir, 'workspace', 'Gerber')
-        found_file = None
+        if file_paths is None:
+            file_paths = list_files(job['gerber_dir'])
 
-        for root, dirs, files in os.walk(gerber_dir):
-            for file in files:
-                if re.search(identification_file_pattern, file, re.IGNORECASE):
-                    found_file = os.path.join(root, file)
-                    break
-            if found_file:
+        # 先并发读取所有文件开头的字节，不做解码；X2属性在文件名不符合规则时也能找到板框文件
+        results, layers, sniffed_bytes = sniff(file_paths, open_file or (lambda file_path: open(file_path, 'rb')), job)
+        count(job, bytes_read=sniffed_bytes, files_read=len(file_paths))
+
+        # 带有X2属性的文件直接按属性分层，文件名规则只作为后备
+        job['x2_layers'] = {member_name(job, file_path, open_file): keys for file_path, keys in layers.items()}
+        if layers:
+            log_message(f"Gerber X2 FileFunction found in {len(layers)} of {len(file_paths)} files.", log_file_path)
+
+        found_file = None
+        target_edge = None
+        for file_path in file_paths:
+            if re.search(identification_file_pattern, os.path.basename(file_path), re.IGNORECASE):
+                found_file = file_path
                 break
 
         if found_file:
@@ -95,42 +155,44 @@ def main():
                 target_edge = 'GM13'
             else:
                 target_edge = 'Unknown'
-
-            # 写入TargetEdge到target.yaml
-            with open(target_yaml_path, 'w', encoding='utf-8') as f:
-                f.write(f"TargetEdge: {target_edge}\n")
-                f.write("#TargetEdge: Edge_Cuts\n")
-                f.write("#TargetEdge: GM1\n")
-                f.write("#TargetEdge: GM13\n")
-            log_message(f"Identified TargetEdge: {target_edge}", log_file_path)
-
-            # 寻找EDA信息
-            with open(found_file, 'r', encoding='utf-8') as f:
-                first_21_lines = [next(f) for _ in range(21)]
-                first_21_text = ''.join(first_21_lines)
-
-            if 'Altium' in first_21_text:
-                eda_tool = 'Altium_Designer'
-            elif 'KiCad' in first_21_text:
-                eda_tool = 'KiCAD'
-            elif 'EasyEDA' in first_21_text:
-                eda_tool = 'LCEDA'
-            else:
-                eda_tool = None
-
-            if eda_tool:
-                # 写入EDA信息到target.yaml
-                with open(target_yaml_path, 'a', encoding='utf-8') as f:
-                    f.write(f"EDA: {eda_tool}\n")
-                    f.write("#EDA: Altium_Designer\n")
-                    f.write("#EDA: KiCAD\n")
-                    f.write("#EDA: LCEDA\n")
-                log_message(f"Identified EDA tool: {eda_tool}", log_file_path)
-            else:
-                log_message("Could not identify EDA tool.", log_file_path)
         else:
-            log_message("No matching edge file found.", log_file_path)
-            return
+            # 文件名都不符合IdentificationFile时，使用FileFunction为Profile的文件
+            found_file = next((file_path for file_path in file_paths if 'Outline' in layers.get(file_path, [])), None)
+            if found_file:
+                log_message(f"Found edge file by Gerber X2 attributes: {found_file}", log_file_path)
+
+        if not found_file:
+            log_message("No matching edge file found.", log_file_path, 'WARNING')
+            return False
+
+        # 按所有文件的结果投票
+        eda_tool, votes = vote_eda(results, found_file)
+        if votes:
+            log_message(f"EDA fingerprints in {len(file_paths)} files: "
+                        + ', '.join(f"{tool} {n}" for tool, n in sorted(votes.items(), key=lambda item: -item[1])), log_file_path)
+
+        # 由X2属性找到的板框文件没有可以判断类型的扩展名，按EDA使用其默认的板框类型
+        if target_edge is None:
+            target_edge = X2_EDGE.get(eda_tool, 'Unknown')
+
+        # 写入TargetEdge到target.yaml
+        with open(target_yaml_path, 'w', encoding='utf-8') as f:
+            f.write(f"TargetEdge: {target_edge}\n")
+            f.write("#TargetEdge: Edge_Cuts\n")
+            f.write("#TargetEdge: GM1\n")
+            f.write("#TargetEdge: GM13\n")
+        log_message(f"Identified TargetEdge: {target_edge}", log_file_path)
+
+        if eda_tool:
+            # 写入EDA信息到target.yaml
+            with open(target_yaml_path, 'a', encoding='utf-8') as f:
+                f.write(f"EDA: {eda_tool}\n")
+                f.write("#EDA: Altium_Designer\n")
+                f.write("#EDA: KiCAD\n")
+                f.write("#EDA: LCEDA\n")
+            log_message(f"Identified EDA tool: {eda_tool}", log_file_path)
+        else:
+            log_message("Could not identify EDA tool.", log_file_path, 'WARNING')
 
     # 如果identification.yaml中的TargetEDA已经被指定
     if target_eda != 'Auto':
@@ -152,20 +214,10 @@ def main():
     # 记录日志结束
     log_message("[identification.py] XC Logs done.", log_file_path)
 
-    # 停止日志写入，恢复标准输出
-    sys.stdout = sys.__stdout__
-
-    # 执行target.py脚本
-    target_script_path = os.path.join(openjlc_dir, 'workspace', 'target.py')
-    if os.path.exists(target_script_path):
-        try:
-            subprocess.run(['python', target_script_path], check=True)
-            print(f"Target script executed successfully.")
-        except subprocess.CalledProcessError as e:
-            print(f"Error executing target script: {e}")
-        return
-    else:
-        print(f"Target script {target_script_path} not found.")
+    return True
+
+def main():
+    run(load_job())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,64 @@
+import os
+import queue
+import atexit
+import threading
+from datetime import datetime
+
+# 日志级别，低于 OPENJLC_LOG_LEVEL（默认INFO）的日志不输出
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+LOG_LEVEL = LEVELS.get(os.environ.get('OPENJLC_LOG_LEVEL', 'INFO').upper(), LEVELS['INFO'])
+
+# 日志文件的写缓冲大小
+BUFFER_SIZE = 64 * 1024
+
+# 日志文件路径 -> 写入线程，每个日志文件只打开一次
+_writers = {}
+_writers_lock = threading.Lock()
+
+def write_loop(log_file, entries):
+    # 后台线程：从队列取出日志写入缓冲区，队列空闲时才刷新到磁盘
+    with log_file:
+        while True:
+            entry = entries.get()
+            if entry is None:
+                break
+            log_file.write(entry)
+            if entries.empty():
+                log_file.flush()
+
+def get_writer(log_file_path):
+    with _writers_lock:
+        writer = _writers.get(log_file_path)
+        # 批量模式下工作进程由主进程fork而来，继承的写入线程在子进程中不存在，需要重新创建
+        if writer is None or writer['pid'] != os.getpid():
+            log_file = open(log_file_path, 'a', encoding='utf-8', buffering=BUFFER_SIZE)
+            entries = queue.SimpleQueue()
+            thread = threading.Thread(target=write_loop, args=(log_file, entries), daemon=True)
+            thread.start()
+            writer = {'pid': os.getpid(), 'entries': entries, 'thread': thread}
+            _writers[log_file_path] = writer
+        return writer
+
+def log_message(message, log_file_path, level='INFO'):
+    if LEVELS[level] < LOG_LEVEL:
+        return
+    current_time = datetime.now().strftime('%H:%M:%S')
+    # INFO保持原来的格式，其他级别在时间后标出级别，例如 12:00:00 [ERROR] ...
+    log_entry = f"{current_time} {message}" if level == 'INFO' else f"{current_time} [{level}] {message}"
+    print(log_entry)  # 输出到终端
+    get_writer(log_file_path)['entries'].put(log_entry + '\n')
+
+def close_log(log_file_path):
+    # 等待队列中的日志全部写完并关闭文件，任务结束时调用
+    with _writers_lock:
+        writer = _writers.pop(log_file_path, None)
+    if writer is not None and writer['pid'] == os.getpid():
+        writer['entries'].put(None)
+        writer['thread'].join()
+
+def close_all():
+    for log_file_path in list(_writers):
+        close_log(log_file_path)
+
+# 正常退出（包括sys.exit）时写完所有日志
+atexit.register(close_all)
@@ -0,0 +1,197 @@
+import os
+import json
+import shutil
+import hashlib
+import zipfile
+from joblog import log_message
+from spans import count
+import zipraw
+from cache import atomic_write, evict_lru
+
+# 版本号参与层ID的计算，OPENJLC_LAYER_CACHE_MB为缓存大小上限
+LAYER_CACHE_VERSION = 1
+LAYER_CACHE_BYTES = int(os.environ.get('OPENJLC_LAYER_CACHE_MB', '1024')) * 1024 * 1024
+
+# 层缓存：输入成员的CRC32和大小（直接取自中央目录）+ 输出文件名 + Header 对应一份已经加好Header并压缩的输出成员
+# 同一个板子改版后，没有变化的层直接把缓存中的压缩数据拼接到输出压缩包，只有变化的层重新处理
+# 一个压缩包内所有层的Header必须相同，所以命中时沿用缓存中命中层数最多的那个Header
+
+def layer_id(info, dest_name):
+    text = f"{LAYER_CACHE_VERSION}:{info.CRC:08x}:{info.file_size}:{dest_name}"
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def header_id(header):
+    return hashlib.sha256(header).hexdigest()
+
+def entry_name(lid, hid):
+    return hashlib.sha256(f"{lid}:{hid}".encode('utf-8')).hexdigest()
+
+def read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_json(path, data):
+    with atomic_write(path, 'w') as f:
+        json.dump(data, f)
+
+def plan(job, source, matches, Config, header):
+    # source为输入压缩包，matches为 规则 -> 成员名
+    # 返回 {'header': 本次使用的Header, 'hits': 输出文件名 -> 缓存条目, 'misses': 输出文件名 -> 层ID}
+    cache_dir = job['layer_cache']
+    layer_ids = {}
+    members = {}
+    for key, member in matches.items():
+        try:
+            info = source.getinfo(member)
+        except KeyError:
+            continue
+        dest_name = Config["FileName"][key]
+        layer_ids[dest_name] = layer_id(info, dest_name)
+        members[dest_name] = member
+
+    # 统计每个Header能命中的层数
+    candidates = {}
+    for dest_name, lid in layer_ids.items():
+        for hid in read_json(os.path.join(cache_dir, f"{lid}.idx")) or []:
+            name = entry_name(lid, hid)
+            if os.path.exists(os.path.join(cache_dir, f"{name}.bin")):
+                candidates.setdefault(hid, {})[dest_name] = name
+
+    result = {'header': header, 'hits': {}, 'misses': dict(layer_ids)}
+    if not candidates:
+        return result
+
+    hid, names = max(candidates.items(), key=lambda item: len(item[1]))
+    for dest_name, name in names.items():
+        entry = read_json(os.path.join(cache_dir, f"{name}.json"))
+        if entry is None:
+            continue
+        entry['path'] = os.path.join(cache_dir, f"{name}.bin")
+        try:
+            # 计划使用的条目立即记录使用时间，打包前不会被其他任务优先淘汰
+            os.utime(entry['path'])
+        except FileNotFoundError:
+            continue
+        entry['lid'] = layer_ids[dest_name]
+        entry['member'] = members[dest_name]
+        result['hits'][dest_name] = entry
+        del result['misses'][dest_name]
+        result['header'] = entry['header'].encode('utf-8')
+
+    if result['hits']:
+        log_message(f"Layer cache hit for {len(result['hits'])} of {len(layer_ids)} layers, reusing their Header.", job['log_file_path'])
+    return result
+
+def cached_member(dest_name, entry, date_time):
+    # 由缓存条目生成输出成员的ZipInfo
+    member = zipfile.ZipInfo(dest_name, date_time)
+    member.compress_type = entry['compress_type']
+    member.CRC = entry['crc']
+    member.compress_size = entry['compress_size']
+    member.file_size = entry['file_size']
+    return member
+
+def splice(job, output, dest_name, entry, date_time, source):
+    # 把缓存中的压缩数据直接写入输出压缩包，不读取也不重新压缩原文件
+    try:
+        src = open(entry['path'], 'rb')
+    except FileNotFoundError:
+        rewrite(job, output, dest_name, entry, date_time, source)
+        return
+    with src:
+        zipraw.write_raw_member(output, cached_member(dest_name, entry, date_time), src)
+    count(job, bytes_read=entry['compress_size'], bytes_written=entry['compress_size'], files_read=1, files_written=1)
+    log_message(f"Spliced cached layer '{dest_name}'", job['log_file_path'])
+
+def rewrite(job, output, dest_name, entry, date_time, source):
+    # 条目在计划之后被其他任务淘汰，从输入压缩包重新处理这一层，结束后重新存入缓存
+    layer_plan = job['layer_plan']
+    member = zipfile.ZipInfo(dest_name, date_time)
+    member.compress_type = output.compression
+    with source.open(entry['member']) as src, output.open(member, 'w') as dst:
+        dst.write(layer_plan['header'])
+        shutil.copyfileobj(src, dst, zipraw.COPY_CHUNK_SIZE)
+    del layer_plan['hits'][dest_name]
+    layer_plan['misses'][dest_name] = entry['lid']
+    count(job, bytes_read=member.file_size - len(layer_plan['header']), bytes_written=member.compress_size,
+          files_read=1, files_written=1)
+    log_message(f"Cached layer '{dest_name}' was evicted, processed '{entry['member']}' again.", job['log_file_path'], 'WARNING')
+
+def store(job):
+    # 缓存只是加速，输出已经生成，写入失败时只记录警告，不影响转换结果
+    try:
+        return store_layers(job)
+    except OSError as e:
+        log_message(f"Could not store layers in {job['layer_cache']}: {e}", job['log_file_path'], 'WARNING')
+        return False
+
+def store_layers(job):
+    # 从生成的输出压缩包中取出重新处理过的层，按原样保存压缩数据
+    layer_plan = job['layer_plan']
+    cache_dir = job['layer_cache']
+    os.makedirs(cache_dir, exist_ok=True)
+    header = layer_plan['header']
+    hid = header_id(header)
+
+    stored = 0
+    with zipfile.ZipFile(job['output'], 'r') as output:
+        for dest_name, lid in layer_plan['misses'].items():
+            try:
+                info = output.getinfo(dest_name)
+            except KeyError:
+                continue
+            name = entry_name(lid, hid)
+
+            zipraw.seek_member_data(output, info)
+            with atomic_write(os.path.join(cache_dir, f"{name}.bin")) as dst:
+                zipraw.copy_data(output.fp, dst, info.compress_size, dest_name)
+
+            write_json(os.path.join(cache_dir, f"{name}.json"), {
+                'crc': info.CRC,
+                'compress_type': info.compress_type,
+                'compress_size': info.compress_size,
+                'file_size': info.file_size,
+                'header': header.decode('utf-8'),
+            })
+
+            # 记录这一层已经缓存过的Header
+            index_path = os.path.join(cache_dir, f"{lid}.idx")
+            hids = read_json(index_path) or []
+            if hid not in hids:
+                write_json(index_path, hids + [hid])
+
+            count(job, bytes_read=info.compress_size, bytes_written=info.compress_size, files_read=1, files_written=1)
+            stored += 1
+
+    log_message(f"Stored {stored} layers in {cache_dir}", job['log_file_path'])
+    evict(cache_dir, LAYER_CACHE_BYTES, job['log_file_path'])
+    return True
+
+def evict(cache_dir, limit, log_file_path):
+    # 淘汰压缩数据后再清理索引中已经失效的Header
+    evicted = evict_lru(cache_dir, '.bin', limit, ['.json'])
+    if evicted:
+        prune_indexes(cache_dir)
+        log_message(f"Evicted {len(evicted)} layers from layer cache.", log_file_path)
+
+def prune_indexes(cache_dir):
+    # 去掉索引中已经被淘汰的Header，全部淘汰时删除索引文件
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.idx'):
+            continue
+        index_path = os.path.join(cache_dir, name)
+        lid = name[:-len('.idx')]
+        hids = read_json(index_path) or []
+        live = [hid for hid in hids if os.path.exists(os.path.join(cache_dir, f"{entry_name(lid, hid)}.bin"))]
+        if len(live) == len(hids):
+            continue
+        try:
+            if live:
+                write_json(index_path, live)
+            else:
+                os.remove(index_path)
+        except OSError:
+            pass
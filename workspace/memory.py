@@ -0,0 +1,94 @@
+import os
+import sys
+import tracemalloc
+
+# 每个阶段记录的分配位置数量
+MEMORY_TOP = int(os.environ.get('OPENJLC_MEMORY_TOP', '5'))
+
+# 观测代码所在的文件，其中的分配（trace事件、日志队列等）不计入阶段
+INSTRUMENTATION_FILES = ['spans.py', 'joblog.py']
+
+def peak_rss():
+    # 进程启动以来的常驻内存峰值（字节），无法获取时返回None
+    try:
+        import resource
+    except ImportError:
+        return windows_peak_rss()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS上单位是字节，Linux上是KB
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def windows_peak_rss():
+    try:
+        import ctypes
+        from ctypes import wintypes
+    except ImportError:
+        return None
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ('cb', wintypes.DWORD),
+            ('PageFaultCount', wintypes.DWORD),
+            ('PeakWorkingSetSize', ctypes.c_size_t),
+            ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t),
+            ('PeakPagefileUsage', ctypes.c_size_t),
+        ]
+
+    try:
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        return None
+
+def take_snapshot():
+    # 不统计tracemalloc、本模块以及spans、joblog等观测代码自身的分配，只保留阶段本身的分配位置
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        + [tracemalloc.Filter(False, os.path.join(os.path.dirname(__file__), name)) for name in INSTRUMENTATION_FILES]
+    )
+
+def start_tracking():
+    # 开始记录一个阶段的内存分配，已经在跟踪时（例如设置了PYTHONTRACEMALLOC）以当前快照为基准
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+        baseline = None
+    else:
+        baseline = take_snapshot()
+    tracemalloc.reset_peak()
+    return {'started': started, 'baseline': baseline}
+
+def stop_tracking(state):
+    # 返回阶段内的Python分配峰值、进程内存峰值和新增内存最多的代码位置
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = take_snapshot()
+    if state['started']:
+        tracemalloc.stop()
+        stats = snapshot.statistics('lineno')
+    else:
+        stats = snapshot.compare_to(state['baseline'], 'lineno')
+
+    top = []
+    for stat in stats[:MEMORY_TOP]:
+        frame = stat.traceback[0]
+        top.append({
+            'site': f"{frame.filename}:{frame.lineno}",
+            'bytes': getattr(stat, 'size_diff', stat.size),
+            'count': getattr(stat, 'count_diff', stat.count),
+        })
+
+    return {
+        'python_peak_bytes': peak,
+        'python_current_bytes': current,
+        'rss_peak_bytes': peak_rss(),
+        'top': top,
+    }
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+from contextlib import contextmanager
+from cache import atomic_write
+
+# Prometheus textfile格式的指标，每个任务结束时累加到状态文件并重新生成 .prom 文件
+# 可以交给 node_exporter 的 textfile collector 采集
+METRICS = {
+    'openjlc_jobs_total': ('counter', "Conversion jobs by final status."),
+    'openjlc_jobs_failed_total': ('counter', "Failed conversion jobs by the stage that failed."),
+    'openjlc_job_seconds': ('histogram', "Wall time of a whole conversion job."),
+    'openjlc_stage_seconds': ('histogram', "Wall time of each pipeline stage."),
+    'openjlc_stage_bytes_read_total': ('counter', "Bytes read by each pipeline stage."),
+    'openjlc_stage_bytes_written_total': ('counter', "Bytes written by each pipeline stage."),
+    'openjlc_input_bytes_total': ('counter', "Size of the input archives."),
+    'openjlc_output_bytes_total': ('counter', "Size of the generated output archives."),
+    'openjlc_boards_by_layers_total': ('counter', "Converted boards by layer count (report.yaml)."),
+    'openjlc_boards_by_source_total': ('counter', "Converted boards by EDA source (report.yaml Source)."),
+}
+
+# 直方图的上界（秒）
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300]
+
+LOCK_TIMEOUT = 10
+
+def job_status(job, ok):
+    # OK：生成了输出文件；Skipped：已经是LCEDA文件等无需转换的情况；Failed：转换失败
+    if ok and job['output']:
+        return 'OK'
+    elif ok:
+        return 'Skipped'
+    return 'Failed'
+
+def failed_stage(job):
+    for record in reversed(job['spans']):
+        if not record['ok']:
+            return record['stage']
+    return 'unknown'
+
+def job_sample(job, ok, seconds, input_bytes):
+    # 从任务上下文中整理出一次任务的指标
+    status = job_status(job, ok)
+    output_bytes = 0
+    if job['output'] and os.path.exists(job['output']):
+        output_bytes = os.path.getsize(job['output'])
+    return {
+        'status': status,
+        'failed_stage': failed_stage(job) if status == 'Failed' else None,
+        'seconds': seconds,
+        'stages': [(r['stage'], r['seconds'], r['bytes_read'], r['bytes_written']) for r in job['spans']],
+        'source': job['source'],
+        'layers': job['layers'],
+        'input_bytes': input_bytes,
+        'output_bytes': output_bytes,
+    }
+
+def label(**labels):
+    return ','.join(f'{key}="{value}"' for key, value in labels.items())
+
+def add_counter(state, name, labels, value=1):
+    series = state['counters'].setdefault(name, {})
+    series[labels] = series.get(labels, 0) + value
+
+def observe(state, name, labels, value):
+    series = state['histograms'].setdefault(name, {})
+    histogram = series.setdefault(labels, {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0})
+    for i, bound in enumerate(BUCKETS):
+        if value <= bound:
+            histogram['buckets'][i] += 1
+    histogram['sum'] += value
+    histogram['count'] += 1
+
+def add_sample(state, sample):
+    add_counter(state, 'openjlc_jobs_total', label(status=sample['status'].lower()))
+    if sample['failed_stage']:
+        add_counter(state, 'openjlc_jobs_failed_total', label(stage=sample['failed_stage']))
+    observe(state, 'openjlc_job_seconds', '', sample['seconds'])
+    for stage, seconds, bytes_read, bytes_written in sample['stages']:
+        observe(state, 'openjlc_stage_seconds', label(stage=stage), seconds)
+        add_counter(state, 'openjlc_stage_bytes_read_total', label(stage=stage), bytes_read)
+        add_counter(state, 'openjlc_stage_bytes_written_total', label(stage=stage), bytes_written)
+    add_counter(state, 'openjlc_input_bytes_total', '', sample['input_bytes'])
+    add_counter(state, 'openjlc_output_bytes_total', '', sample['output_bytes'])
+    if sample['status'] == 'OK':
+        add_counter(state, 'openjlc_boards_by_layers_total', label(layers=sample['layers']))
+        add_counter(state, 'openjlc_boards_by_source_total', label(source=sample['source']))
+
+def series_name(name, labels, extra=''):
+    labels = ','.join(part for part in (labels, extra) if part)
+    return f"{name}{{{labels}}}" if labels else name
+
+def render(state):
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == 'counter':
+            for labels, value in sorted(state['counters'].get(name, {}).items()):
+                lines.append(f"{series_name(name, labels)} {value}")
+        else:
+            for labels, histogram in sorted(state['histograms'].get(name, {}).items()):
+                for bound, value in zip(BUCKETS, histogram['buckets']):
+                    lines.append(f"{series_name(name + '_bucket', labels, label(le=bound))} {value}")
+                lines.append(f"{series_name(name + '_bucket', labels, label(le='+Inf'))} {histogram['count']}")
+                lines.append(f"{series_name(name + '_sum', labels)} {histogram['sum']}")
+                lines.append(f"{series_name(name + '_count', labels)} {histogram['count']}")
+    return '\n'.join(lines) + '\n'
+
+@contextmanager
+def locked(path):
+    # 用独占创建的锁文件串行化多个进程的更新，超时后视为残留的锁
+    lock_path = path + '.lock'
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                os.remove(lock_path)
+                deadline = time.monotonic() + LOCK_TIMEOUT
+            else:
+                time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+def write_atomic(path, text):
+    with atomic_write(path, 'w') as f:
+        f.write(text)
+
+def record(path, samples):
+    # 累加到 <path>.json 中保存的计数，再重新生成整个textfile
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    state_path = path + '.json'
+    with locked(path):
+        state = {'counters': {}, 'histograms': {}}
+        if os.path.exists(state_path):
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        for sample in samples:
+            add_sample(state, sample)
+        write_atomic(state_path, json.dumps(state))
+        write_atomic(path, render(state))
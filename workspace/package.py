@@ -1,117 +1,143 @@
 import os
+import copy
 import shutil
+import struct
 import time
 import zipfile
-import yaml
-import subprocess
-from datetime import datetime
-import sys
-
-def log_message(message, log_file_path):
-    current_time = datetime.now().strftime('%H:%M:%S')
-    log_entry = f"{current_time} {message}"
-    print(log_entry)  # 输出到终端
-    with open(log_file_path, 'a', encoding='utf-8') as log_file:
-        log_file.write(log_entry + '\n')
-        log_file.flush()  # 确保每次写入后立即刷新
+import yamlio
+from context import load_job
+from joblog import log_message
+from spans import count, file_span
+from zipraw import seek_member_data, write_raw_member
+import layers
+
+DATA_DESCRIPTOR_FLAG = 0x08
+ZIP64_EXTRA_ID = 0x0001
+
+def strip_zip64_extra(extra):
+    # 去掉原有的zip64扩展字段，写入时由FileHeader按实际大小重新生成
+    result = b''
+    while len(extra) >= 4:
+        header_id, size = struct.unpack('<HH', extra[:4])
+        if header_id != ZIP64_EXTRA_ID:
+            result += extra[:4 + size]
+        extra = extra[4 + size:]
+    return result
+
+def copy_raw_member(source, output, info):
+    # 直接复制成员压缩后的数据和CRC，不解压也不重新压缩
+    seek_member_data(source, info)
+
+    member = copy.copy(info)
+    member.flag_bits &= ~DATA_DESCRIPTOR_FLAG  # 大小和CRC直接写在本地文件头中
+    member.extra = strip_zip64_extra(info.extra)
+    write_raw_member(output, member, source.fp)
+
+def copy_raw_members(job, source, output):
+    # LCEDA文件不需要转换，所有成员按原压缩数据写入输出压缩包
+    log_file_path = job['log_file_path']
+    copied = 0
+    copied_bytes = 0
+    for info in source.infolist():
+        if info.is_dir():
+            continue
+        with file_span(job, info.filename, 'zip'):
+            copy_raw_member(source, output, info)
+        copied += 1
+        copied_bytes += info.compress_size
+    log_message(f"Copied {copied} members without recompression.", log_file_path)
+    return copied, copied_bytes
+
+def package_name(package_data, report_data):
+    # 根据report内容生成输出文件名 <name>-<EDA>-L<n>.zip，返回 (文件名, Source, 层数)
+    # 根据Source字段确定名字
+    source = report_data.get('Source', 'Unknown')
+    if source == 'LCEDA':
+        name_str = "LC"
+    elif source == 'AD':
+        name_str = "AD"
+    elif source == 'KiCAD':
+        name_str = "Ki"
+    else:
+        name_str = "Err"
 
-def main():
-    # 获取OpenJLC路径
-    openjlc_dir = os.environ.get("OpenJLC")
-    if not openjlc_dir:
-        print("Error: OpenJLC environment variable is not set.")
-        return
-
-    # 读取package.yaml文件中的日志文件路径
-    package_yaml_path = os.path.join(openjlc_dir, 'workspace', 'package.yaml')
-    if not os.path.exists(package_yaml_path):
-        print("Error: package.yaml not found.")
-        return
-
-    with open(package_yaml_path, 'r', encoding='utf-8') as package_file:
-        package_data = yaml.safe_load(package_file)
-        log_filename = package_data.get('logs')
-        if not log_filename:
-            print("Error: 'logs' field not found in package.yaml.")
-            return
-
-    # 设置日志文件路径
-    log_file_path = os.path.join(openjlc_dir, 'logs', log_filename)
+    # 计算层数
+    layers = sum(1 for key in ['Top_Cu', 'Bottom_Cu', 'InnerLayer1_Cu', 'InnerLayer2_Cu', 'InnerLayer3_Cu', 'InnerLayer4_Cu'] if report_data.get(key) == 'Yes')
+    if layers == 1:
+        layer_str = "L1"
+    elif layers == 2:
+        layer_str = "L2"
+    elif layers in [4, 6]:
+        layer_str = f"L{layers}"
+    else:
+        layer_str = "Err"
+
+    # 修改文件名
+    base_name = os.path.splitext(package_data['name'])[0]
+    new_package_name = f"{base_name}-{name_str}-{layer_str}.zip"
+    return new_package_name, source, layer_str
+
+def run(job):
+    log_file_path = job['log_file_path']
 
     # 记录package.py日志开始
     log_message("[package.py] XC Logs start collecting.", log_file_path)
 
     # 定义工作流目录和文件路径
-    workflow_dir = os.path.join(openjlc_dir, 'workspace', 'workflow')
-    gerber_file = os.path.join(openjlc_dir, 'workspace', 'Gerber', 'PCB下单必读.txt')
-    report_file = os.path.join(openjlc_dir, 'workspace', 'report.yaml')
-
-    # 等待0.3秒
-    time.sleep(0.3)
+    workflow_dir = job['workflow_dir']
+    gerber_file = os.path.join(job['gerber_dir'], 'PCB下单必读.txt')
+    report_file = job['report_yaml']
 
     # 确保工作流目录存在
     if not os.path.exists(workflow_dir):
-        log_message(f"Workflow directory {workflow_dir} does not exist.", log_file_path)
-        return
+        log_message(f"Workflow directory {workflow_dir} does not exist.", log_file_path, 'ERROR')
+        return False
 
     # 复制PCB下单必读.txt到workflow目录
     if os.path.exists(gerber_file):
         shutil.copy2(gerber_file, workflow_dir)
+        size = os.path.getsize(gerber_file)
+        count(job, bytes_read=size, bytes_written=size, files_read=1, files_written=1)
         log_message(f"Copied {gerber_file} to {workflow_dir}", log_file_path)
     else:
-        log_message(f"{gerber_file} does not exist.", log_file_path)
-        return
+        log_message(f"{gerber_file} does not exist.", log_file_path, 'ERROR')
+        return False
 
     # 读取report.yaml文件
     if os.path.exists(report_file):
         with open(report_file, 'r', encoding='utf-8') as f:
-            report_data = yaml.safe_load(f)
-    else:
-        log_message(f"{report_file} does not exist.", log_file_path)
-        return
-
-    # 根据Source字段确定名字
-    source = report_data.get('Source', 'Unknown')
-    if source == 'LCEDA':
-        name_str = "LC"
-    elif source == 'AD':
-        name_str = "AD"
-    elif source == 'KiCAD':
-        name_str = "Ki"
+            report_data = yamlio.load(f)
     else:
-        name_str = "Err"
+        log_message(f"{report_file} does not exist.", log_file_path, 'ERROR')
+        return False
 
     # 打包workflow目录下的所有文件到package.zip
-    package_zip = os.path.join(openjlc_dir, 'workspace', 'package.zip')
+    package_zip = os.path.join(job['workspace_dir'], 'package.zip')
     with zipfile.ZipFile(package_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for root, dirs, files in os.walk(workflow_dir):
-            for file in files:
-                zipf.write(os.path.join(root, file), os.path.relpath(os.path.join(root, file), workflow_dir))
+        if job['eda'] == 'LCEDA' and os.path.exists(job['source_zip']):
+            # LCEDA文件原样打包，直接从输入压缩包复制压缩数据
+            with zipfile.ZipFile(job['source_zip'], 'r') as source:
+                copied, copied_bytes = copy_raw_members(job, source, zipf)
+            count(job, bytes_read=copied_bytes, files_read=copied)
+            zipf.write(gerber_file, 'PCB下单必读.txt')
+        else:
+            for root, dirs, files in os.walk(workflow_dir):
+                for file in files:
+                    with file_span(job, file, 'zip'):
+                        zipf.write(os.path.join(root, file), os.path.relpath(os.path.join(root, file), workflow_dir))
+                    count(job, bytes_read=os.path.getsize(os.path.join(root, file)), files_read=1)
+            # 层缓存命中的文件没有写入workflow目录，直接拼接缓存中的压缩数据
+            if job['layer_plan'] and job['layer_plan']['hits']:
+                date_time = time.localtime()[:6]
+                with zipfile.ZipFile(job['source_zip'], 'r') as source:
+                    for dest_name, entry in list(job['layer_plan']['hits'].items()):
+                        with file_span(job, dest_name, 'zip'):
+                            layers.splice(job, zipf, dest_name, entry, date_time, source)
     log_message(f"Packaged files into {package_zip}", log_file_path)
 
-    # 读取package.yaml文件
-    if os.path.exists(package_yaml_path):
-        with open(package_yaml_path, 'r', encoding='utf-8') as f:
-            package_data = yaml.safe_load(f)
-    else:
-        log_message(f"{package_yaml_path} does not exist.", log_file_path)
-        return
-
-    # 计算层数和生成新的文件名
-    layers = sum(1 for key in ['Top_Cu', 'Bottom_Cu', 'InnerLayer1_Cu', 'InnerLayer2_Cu', 'InnerLayer3_Cu', 'InnerLayer4_Cu'] if report_data.get(key) == 'Yes')
-    if layers == 1:
-        layer_str = "L1"
-    elif layers == 2:
-        layer_str = "L2"
-    elif layers in [4, 6]:
-        layer_str = f"L{layers}"
-    else:
-        layer_str = "Err"
-
-    # 修改文件名
-    base_name = os.path.splitext(package_data['name'])[0]
-    new_package_name = f"{base_name}-{name_str}-{layer_str}.zip"
-    new_package_path = os.path.join(openjlc_dir, 'workspace', new_package_name)
+    package_data = job['package']
+    new_package_name, source, layer_str = package_name(package_data, report_data)
+    new_package_path = os.path.join(job['workspace_dir'], new_package_name)
 
     # 重命名并复制文件
     os.rename(package_zip, new_package_path)
@@ -119,26 +145,26 @@ def main():
 
     destination_path = os.path.join(package_data['original'], new_package_name)
     shutil.copy2(new_package_path, destination_path)
+    # 临时的package.zip和复制到原目录的文件各写入一次
+    size = os.path.getsize(destination_path)
+    count(job, bytes_read=size, bytes_written=2 * size, files_written=1)
     log_message(f"Copied {new_package_name} to {package_data['original']}", log_file_path)
 
+    # 记录打包结果，供批量模式汇总
+    job['output'] = destination_path
+    job['source'] = source
+    job['layers'] = layer_str
+
     # 删除workspace中的package.zip
     os.remove(new_package_path)
     log_message(f"Deleted {new_package_name} from workspace.", log_file_path)
 
     # 记录package.py日志结束
     log_message("[package.py] XC Logs done.", log_file_path)
-    sys.stdout = sys.__stdout__  # 恢复标准输出
-
-    # 执行clear.py脚本
-    clear_script_path = os.path.join(openjlc_dir, 'workspace', 'clear.py')
-    if os.path.exists(clear_script_path):
-        try:
-            subprocess.run(['python', clear_script_path], check=True)
-            print(f"Clear script executed successfully.")
-        except subprocess.CalledProcessError as e:
-            print(f"Error executing clear script: {e}")
-    else:
-        print(f"Clear script {clear_script_path} not found.")
+    return True
+
+def main():
+    run(load_job())
 
 if __name__ == "__main__":
     main()
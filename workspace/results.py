@@ -0,0 +1,105 @@
+import os
+import json
+import shutil
+import hashlib
+from joblog import log_message
+from spans import count
+from cache import atomic_write, evict_lru
+
+# 缓存格式变化时修改版本号，旧的缓存条目自动失效
+RESULT_CACHE_VERSION = 1
+
+# 结果缓存的总大小上限，超过后按最近使用时间淘汰
+RESULT_CACHE_BYTES = int(os.environ.get('OPENJLC_RESULT_CACHE_MB', '1024')) * 1024 * 1024
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def file_sha256(path, digest=None):
+    digest = digest or hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest
+
+def settings_hash(openjlc_dir):
+    # 影响输出结果的全部配置：识别规则、两套层规则、默认config.yaml，以及生成Header的init.py
+    digest = hashlib.sha256(f"openjlc-result-cache-{RESULT_CACHE_VERSION}".encode('utf-8'))
+    for relative_path in ['rule/identification.yaml', 'rule/rule_altium_designer.yaml', 'rule/rule_kicad.yaml',
+                          'workspace/config.yaml', 'init.py']:
+        path = os.path.join(openjlc_dir, relative_path)
+        digest.update(relative_path.encode('utf-8'))
+        if os.path.exists(path):
+            file_sha256(path, digest)
+    return digest.hexdigest()
+
+def result_key(job, zip_file_path):
+    # 输入压缩包内容的SHA-256 + 配置的哈希
+    return hashlib.sha256((file_sha256(zip_file_path).hexdigest() + settings_hash(job['openjlc_dir'])).encode('utf-8')).hexdigest()
+
+def entry_paths(job, key):
+    return os.path.join(job['result_cache'], f"{key}.zip"), os.path.join(job['result_cache'], f"{key}.json")
+
+def lookup(job, zip_file_path):
+    # 返回缓存条目的信息，未命中时返回None
+    key = result_key(job, zip_file_path)
+    job['result_key'] = key
+    archive_path, meta_path = entry_paths(job, key)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        os.utime(archive_path)  # 记录最近一次使用的时间，淘汰时保留常用的条目
+        os.utime(meta_path)
+    except (OSError, ValueError):
+        return None
+    entry['archive_path'] = archive_path
+    return entry
+
+def restore(job, entry, zip_file_path):
+    # 把缓存的输出复制到输入文件旁边，文件名按这次输入的名字生成
+    base_name = os.path.splitext(os.path.basename(zip_file_path))[0]
+    destination_path = os.path.join(os.path.dirname(zip_file_path), base_name + entry['suffix'])
+    shutil.copyfile(entry['archive_path'], destination_path)
+    size = os.path.getsize(destination_path)
+    count(job, bytes_read=size, bytes_written=size, files_read=1, files_written=1)
+    log_message(f"Result cache hit {job['result_key'][:12]}, copied {os.path.basename(destination_path)}", job['log_file_path'])
+
+    job['eda'] = entry['eda']
+    job['output'] = destination_path
+    job['source'] = entry['source']
+    job['layers'] = entry['layers']
+
+def store(job, zip_file_path):
+    # 转换成功后保存输出，记录输出文件名相对输入文件名的后缀，例如 -Ki-L2.zip
+    base_name = os.path.splitext(os.path.basename(zip_file_path))[0]
+    output_name = os.path.basename(job['output'])
+    if not output_name.startswith(base_name):
+        return False
+    entry = {
+        'suffix': output_name[len(base_name):],
+        'eda': job['eda'],
+        'source': job['source'],
+        'layers': job['layers'],
+    }
+
+    # 多个任务同时写入同一条目时不会留下不完整的文件
+    # 缓存只是加速，输出已经生成，写入失败时只记录警告，不影响转换结果
+    try:
+        os.makedirs(job['result_cache'], exist_ok=True)
+        archive_path, meta_path = entry_paths(job, job['result_key'])
+        with open(job['output'], 'rb') as src, atomic_write(archive_path) as dst:
+            shutil.copyfileobj(src, dst)
+        with atomic_write(meta_path, 'w') as f:
+            json.dump(entry, f)
+        size = os.path.getsize(archive_path)
+        count(job, bytes_read=size, bytes_written=size, files_read=1, files_written=1)
+        log_message(f"Stored result {job['result_key'][:12]} in {job['result_cache']}", job['log_file_path'])
+
+        evict(job['result_cache'], RESULT_CACHE_BYTES, job['log_file_path'])
+    except OSError as e:
+        log_message(f"Could not store result in {job['result_cache']}: {e}", job['log_file_path'], 'WARNING')
+        return False
+    return True
+
+def evict(cache_dir, limit, log_file_path):
+    for archive_path in evict_lru(cache_dir, '.zip', limit, ['.json']):
+        log_message(f"Evicted {os.path.basename(archive_path)} from result cache.", log_file_path)
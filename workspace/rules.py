@@ -0,0 +1,91 @@
+import re
+
+# 规则开头的全局标记，例如 (?i)，合并后必须改写成局部标记
+GLOBAL_FLAGS = re.compile(r'^\(\?([aiLmsux]+)\)')
+
+# 反向引用的组号在合并后会错位，含有反向引用的规则集不合并
+BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+# 只由若干个 \.扩展名 组成的规则
+SUFFIX_RULE = re.compile(r'\\\.[A-Za-z0-9_]+(?:\|\\\.[A-Za-z0-9_]+)*')
+
+# 已编译的规则集，同一进程内处理多个压缩包时（批量模式）只编译一次
+_compiled = {}
+
+def scope_flags(pattern):
+    # (?i)abc -> (?i:abc)，合并到一个表达式里时不影响其他规则
+    m = GLOBAL_FLAGS.match(pattern)
+    if m:
+        return f"(?{m.group(1)}:{pattern[m.end():]})"
+    return pattern
+
+def suffix_extensions(pattern):
+    # 识别只匹配扩展名的规则，例如 (\.gtl|\.GTL)$ 或 \.gbr$，返回小写扩展名列表，否则返回None
+    if pattern.startswith('(') and pattern.endswith(')$'):
+        inner = pattern[1:-2]
+    elif pattern.endswith('$'):
+        inner = pattern[:-1]
+    else:
+        return None
+    if not SUFFIX_RULE.fullmatch(inner):
+        return None
+    return sorted({alternative[2:].lower() for alternative in inner.split('|')})
+
+def compile_rules(Rule):
+    # 规则内容相同的规则集直接复用已编译的结果
+    cache_key = tuple(Rule.items())
+    if cache_key not in _compiled:
+        _compiled[cache_key] = build_matcher(Rule)
+    return _compiled[cache_key]
+
+def build_matcher(Rule):
+    # 纯扩展名规则放进 扩展名 -> 规则 的字典，查一次字典即可
+    # 其余规则合并成一个正则，每条规则是一个可选的前瞻分组
+    # 一次match就能得到文件名匹配到的全部规则，与逐条search的结果一致
+    keys = list(Rule.keys())
+    suffixes = {}
+    regex_keys = []
+    for key in keys:
+        extensions = suffix_extensions(Rule[key])
+        if extensions is None:
+            regex_keys.append(key)
+            continue
+        for extension in extensions:
+            suffixes.setdefault(extension, []).append(key)
+
+    branches = [f"(?:(?=(?P<r{i}>[\\s\\S]*?(?:{scope_flags(Rule[key])})))|)" for i, key in enumerate(regex_keys)]
+    combined = None
+    if regex_keys and not any(BACKREFERENCE.search(Rule[key]) for key in regex_keys):
+        try:
+            combined = re.compile('^' + ''.join(branches), flags=re.IGNORECASE)
+        except re.error:
+            # 规则中含有无法合并的写法（例如重名的命名分组）时，退回逐条匹配
+            combined = None
+
+    patterns = []
+    if combined is None:
+        patterns = [(key, re.compile(pattern=Rule[key], flags=re.IGNORECASE)) for key in regex_keys]
+
+    return {
+        'order': {key: i for i, key in enumerate(keys)},
+        'suffixes': suffixes,
+        'regex_keys': regex_keys,
+        'combined': combined,
+        'patterns': patterns,
+    }
+
+def classify(matcher, file_name):
+    # 返回文件名匹配到的全部规则，顺序与规则文件一致
+    matched = []
+    if '.' in file_name:
+        matched.extend(matcher['suffixes'].get(file_name.rpartition('.')[2].lower(), []))
+
+    if matcher['combined'] is not None:
+        groups = matcher['combined'].match(file_name).groupdict()
+        matched.extend(key for i, key in enumerate(matcher['regex_keys']) if groups[f"r{i}"] is not None)
+    else:
+        matched.extend(key for key, rePattern in matcher['patterns'] if rePattern.search(file_name))
+
+    if len(matched) > 1:
+        matched.sort(key=matcher['order'].get)
+    return matched
@@ -0,0 +1,149 @@
+import io
+import os
+import json
+import time
+import pstats
+import cProfile
+from contextlib import contextmanager
+from joblog import log_message
+import memory
+
+# 打开profile时日志中列出的函数数量
+PROFILE_TOP = int(os.environ.get('OPENJLC_PROFILE_TOP', '20'))
+
+def spans_path(log_file_path):
+    # 与日志文件同名的JSON Lines文件，例如 logs/xxx.log -> logs/xxx.spans.jsonl
+    return os.path.splitext(log_file_path)[0] + '.spans.jsonl'
+
+def trace_path(log_file_path):
+    # Chrome Trace Event格式的文件，可以用 chrome://tracing 或 Perfetto 打开
+    return os.path.splitext(log_file_path)[0] + '.trace.json'
+
+def profile_dir(log_file_path):
+    # 每个任务的.pstats文件放在日志旁边的同名目录中
+    return os.path.splitext(log_file_path)[0] + '.profile'
+
+def write_profile(job, stage, profiler):
+    # 保存完整的.pstats，并把按累计耗时排序的前N项写入日志
+    directory = profile_dir(job['log_file_path'])
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{stage}.pstats")
+    profiler.dump_stats(path)
+
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(PROFILE_TOP)
+    log_message(f"Profile of {stage} saved to {path}\n{summary.getvalue().strip()}", job['log_file_path'])
+
+def write_memory(job, stage, usage):
+    rss = usage['rss_peak_bytes']
+    rss_text = f"{rss / 1048576:.1f} MiB" if rss is not None else "unknown"
+    sites = '\n'.join(f"  {site['site']}: {site['bytes'] / 1024:.1f} KiB in {site['count']} blocks" for site in usage['top'])
+    log_message(f"Memory of {stage}: Python peak {usage['python_peak_bytes'] / 1048576:.1f} MiB, process peak {rss_text}\n{sites}",
+                job['log_file_path'])
+
+def write_span(job, record):
+    with open(spans_path(job['log_file_path']), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+@contextmanager
+def stage_span(job, stage):
+    # 记录一个阶段的耗时（单调时钟）、读写字节数和文件数，结束时写入spans文件
+    record = {
+        'stage': stage,
+        'archive': None,
+        'pid': os.getpid(),
+        'start': time.time(),
+        'seconds': 0.0,
+        'ok': False,
+        'bytes_read': 0,
+        'bytes_written': 0,
+        'files_read': 0,
+        'files_written': 0,
+    }
+    job['span'] = record
+    # 先创建profiler再开始跟踪内存，profile的导出也放在内存统计之后，不计入阶段的内存占用
+    profiler = cProfile.Profile() if job['profile'] else None
+    tracking = memory.start_tracking() if job['memory'] else None
+    trace_start = time.time_ns()
+    start = time.perf_counter_ns()
+    if profiler:
+        profiler.enable()
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        record['seconds'] = (time.perf_counter_ns() - start) / 1e9
+        if tracking:
+            record['memory'] = memory.stop_tracking(tracking)
+        if profiler:
+            write_profile(job, stage, profiler)
+        if tracking:
+            write_memory(job, stage, record['memory'])
+        record['archive'] = job['package'].get('name')
+        job['span'] = None
+        job['spans'].append(record)
+        write_span(job, record)
+        if job['trace']:
+            add_event(job, stage, 'stage', trace_start, time.perf_counter_ns() - start,
+                      {key: record[key] for key in ('ok', 'bytes_read', 'bytes_written', 'files_read', 'files_written')})
+
+def run_stage(job, stage, func, *args):
+    # 在span中执行一个阶段函数，返回阶段函数的结果
+    with stage_span(job, stage) as record:
+        record['ok'] = bool(func(job, *args))
+    return record['ok']
+
+def count(job, bytes_read=0, bytes_written=0, files_read=0, files_written=0):
+    # 累加到当前阶段的span中，单独运行阶段脚本时没有span，直接忽略
+    record = job.get('span')
+    if record is None:
+        return
+    record['bytes_read'] += bytes_read
+    record['bytes_written'] += bytes_written
+    record['files_read'] += files_read
+    record['files_written'] += files_written
+
+def add_event(job, name, category, start_ns, duration_ns, args):
+    # 时间戳使用墙上时间（微秒），批量模式下不同进程的事件可以放在同一条时间轴上
+    job['trace_events'].append({
+        'name': name,
+        'cat': category,
+        'ph': 'X',
+        'ts': start_ns / 1000,
+        'dur': duration_ns / 1000,
+        'pid': os.getpid(),
+        'tid': 1,
+        'args': args,
+    })
+
+@contextmanager
+def file_span(job, name, category):
+    # 单个文件的处理过程（加Header、规则匹配、写入压缩包），只在打开trace时记录
+    if job is None or not job['trace']:
+        yield
+        return
+    trace_start = time.time_ns()
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        add_event(job, name, category, trace_start, time.perf_counter_ns() - start, {'stage': (job['span'] or {}).get('stage')})
+
+def trace_document(events, names):
+    # names为 (pid, tid) -> 名称，作为查看器中每一行的标题
+    metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                for (pid, tid), name in names.items()]
+    return {'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}
+
+def write_trace(path, events, names):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(trace_document(events, names), f, ensure_ascii=False)
+
+def write_job_trace(job):
+    # 每个任务的trace写在日志旁边
+    names = {(os.getpid(), 1): job['package'].get('name') or 'job'}
+    write_trace(trace_path(job['log_file_path']), job['trace_events'], names)
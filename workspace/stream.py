@@ -0,0 +1,103 @@
+import os
+import time
+import shutil
+import zipfile
+import identification
+import target
+import convert
+import skip
+import package
+import layers
+from spans import run_stage, stage_span, count, file_span
+from joblog import log_message
+
+def open_member(source):
+    # 以字节方式打开压缩包成员，供identification读取文件头
+    return lambda name: source.open(name)
+
+def new_member(name):
+    # 新写入的成员使用当前时间，与打包workflow目录时的文件时间一致
+    info = zipfile.ZipInfo(name, time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+def write_layers(job, source, output, matches, Config, header, hits):
+    # 从输入压缩包读取成员，加上Header后直接写入输出压缩包，中间不落盘
+    log_file_path = job['log_file_path']
+    date_time = time.localtime()[:6]
+    for key, member in matches.items():
+        dest_name = Config["FileName"][key]
+        if dest_name in hits:
+            # 层缓存命中，直接拼接缓存中的压缩数据
+            with file_span(job, dest_name, 'zip'):
+                layers.splice(job, output, dest_name, hits[dest_name], date_time, source)
+            continue
+        with file_span(job, member, 'zip'), source.open(member) as src, output.open(new_member(dest_name), 'w') as dst:
+            dst.write(header)
+            shutil.copyfileobj(src, dst, convert.COPY_CHUNK_SIZE)
+        size = source.getinfo(member).file_size
+        count(job, bytes_read=size, bytes_written=len(header) + size, files_read=1, files_written=1)
+        log_message(f"Processed file '{member}' and saved to '{dest_name}'", log_file_path)
+
+def run(job, source):
+    # source为已经打开的输入zipfile.ZipFile，输出压缩包直接写到原文件夹
+    log_file_path = job['log_file_path']
+
+    log_message("[stream.py] XC Logs start collecting.", log_file_path)
+
+    file_names = [info.filename for info in source.infolist() if not info.is_dir()]
+    top_level_names = [name for name in file_names if '/' not in name]
+    txt_file = os.path.join(job['output_dir'], 'PCB下单必读.txt')
+
+    if not run_stage(job, 'identification', identification.run, file_names, open_member(source)):
+        return False
+    if not run_stage(job, 'target', target.run):
+        return False
+
+    # 流式模式下只需要匹配规则并生成报告，文件内容在打包时一并写入
+    with stage_span(job, 'skip' if job['eda'] == 'LCEDA' else 'convert') as span:
+        if job['eda'] == 'LCEDA':
+            report = skip.build_report(top_level_names + ['PCB下单必读.txt'], log_file_path, job['x2_layers'])
+            convert.write_report(report, job['report_yaml'], log_file_path)
+        else:
+            Config, HeaderConfig, Rule, rule_type = convert.load_rules(job)
+            report = convert.new_report(rule_type, Rule)
+            matches = convert.check_rules(Rule, top_level_names, report, log_file_path, job)
+            convert.write_report(report, job['report_yaml'], log_file_path)
+            header = HeaderConfig["Header"].encode("utf-8")
+            hits = {}
+            if job['layer_cache']:
+                job['layer_plan'] = layers.plan(job, source, matches, Config, header)
+                header = job['layer_plan']['header']
+                hits = job['layer_plan']['hits']
+        span['ok'] = True
+
+    # 先写入临时文件，完成后再改名，避免失败时留下不完整的压缩包
+    package_data = job['package']
+    new_package_name, source_name, layer_str = package.package_name(package_data, report)
+    destination_path = os.path.join(package_data['original'], new_package_name)
+    partial_path = destination_path + '.part'
+
+    with stage_span(job, 'package') as span:
+        try:
+            with zipfile.ZipFile(partial_path, 'w', zipfile.ZIP_DEFLATED) as output:
+                if job['eda'] == 'LCEDA':
+                    copied, copied_bytes = package.copy_raw_members(job, source, output)
+                    count(job, bytes_read=copied_bytes, bytes_written=copied_bytes, files_read=copied, files_written=copied)
+                else:
+                    write_layers(job, source, output, matches, Config, header, hits)
+                output.write(txt_file, 'PCB下单必读.txt')
+            os.replace(partial_path, destination_path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+        span['ok'] = True
+    log_message(f"Packaged {new_package_name} to {package_data['original']}", log_file_path)
+
+    # 记录打包结果，供批量模式汇总
+    job['output'] = destination_path
+    job['source'] = source_name
+    job['layers'] = layer_str
+
+    log_message("[stream.py] XC Logs done.", log_file_path)
+    return True
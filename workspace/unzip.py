@@ -1,49 +1,74 @@
 import os
 import sys
 import time
+import re
 import zipfile
-from datetime import datetime
-import yaml
-
-def log_message(message, log_file_path):
-    current_time = datetime.now().strftime('%H:%M:%S')
-    log_entry = f"{current_time} {message}"
-    print(log_entry)  # 输出到终端
-    with open(log_file_path, 'a', encoding='utf-8') as log_file:
-        log_file.write(log_entry + '\n')
-        log_file.flush()  # 确保每次写入后立即刷新
-
-def main():
-    # 获取当前脚本所在的目录（即 OpenJLC/workspace）
-    workspace_dir = os.path.dirname(os.path.abspath(__file__))
-
-    # 读取 package.yaml 文件中的日志文件路径
-    package_yaml_path = os.path.join(workspace_dir, 'package.yaml')
-    if not os.path.exists(package_yaml_path):
-        print("Error: package.yaml not found.")
-        sys.exit(1)
-
-    with open(package_yaml_path, 'r', encoding='utf-8') as package_file:
-        package_data = yaml.safe_load(package_file)
-        log_filename = package_data.get('logs')
-        if not log_filename:
-            print("Error: 'logs' field not found in package.yaml.")
-            sys.exit(1)
-
-    # 设置日志文件路径
-    log_file_path = os.path.join(os.path.dirname(workspace_dir), 'logs', log_filename)
+import yamlio
+from context import load_job
+from cache import load_cached
+from rules import compile_rules, classify
+from joblog import log_message
+from spans import count
+import skip
+import identification
+import x2
+
+# 解压前先按规则筛选成员，只有后续阶段会读取的文件才写入磁盘
+RULE_FILES = ['rule_altium_designer.yaml', 'rule_kicad.yaml']
+MUST_READ_FILE = 'PCB下单必读.txt'
+# macOS压缩时附带的资源分支目录
+IGNORED_DIRS = ('__MACOSX/',)
+
+def load_selectors(job):
+    # 此时还不知道EDA，两套层规则都要参与筛选；LCEDA的报告按文件名生成，也要保留对应的文件
+    openjlc_dir = job['openjlc_dir']
+    matchers = []
+    for rule_name in RULE_FILES:
+        rule_file = os.path.join(openjlc_dir, 'rule', rule_name)
+        if os.path.exists(rule_file):
+            matchers.append(compile_rules(load_cached(openjlc_dir, rule_file, yamlio.load)))
+    matchers.append(compile_rules(skip.FILE_MAPPING))
+
+    identification_yaml_path = os.path.join(openjlc_dir, 'rule', 'identification.yaml')
+    identification_config = load_cached(openjlc_dir, identification_yaml_path, yamlio.load)
+    identification_file = re.compile(identification_config.get('IdentificationFile', identification.DEFAULT_IDENTIFICATION_FILE), re.IGNORECASE)
+    return matchers, identification_file
+
+def has_x2_layer(zip_ref, info):
+    # 文件名不符合任何规则时，读取开头检查是否带有可以分层的Gerber X2属性
+    with zip_ref.open(info) as f:
+        attributes, file_format = x2.parse(f.read(identification.SNIFF_BYTES))
+    return x2.layer_keys(attributes, file_format) is not None
+
+def select_members(job, zip_ref, members):
+    # convert和skip只读取顶层文件，识别阶段会遍历所有子目录查找板框文件
+    matchers, identification_file = load_selectors(job)
+    selected = []
+    for info in members:
+        name = info.filename
+        if name.startswith(IGNORED_DIRS):
+            continue
+        if identification_file.search(os.path.basename(name)):
+            selected.append(info)
+        elif '/' not in name and (name == MUST_READ_FILE or any(classify(matcher, name) for matcher in matchers)
+                                  or has_x2_layer(zip_ref, info)):
+            selected.append(info)
+    return selected
+
+def run(job):
+    log_file_path = job['log_file_path']
 
     # 记录日志开始
     log_message("[unzip.py] XC Logs start collecting.", log_file_path)
 
     # 定义 Gerber 文件夹路径
-    gerber_dir = os.path.join(workspace_dir, 'Gerber')
+    gerber_dir = job['gerber_dir']
 
     # 1. 判断文件夹是否为空
     if not os.listdir(gerber_dir):
         log_message("File Not Found.", log_file_path)
         time.sleep(3)
-        sys.exit()
+        return False
 
     # 2. 检查是否存在 .zip 文件
     zip_files = [f for f in os.listdir(gerber_dir) if f.endswith('.zip')]
@@ -52,33 +77,41 @@ def main():
         # 5. 如果没有 .zip 文件则跳过解压
         log_message("No .zip files found.", log_file_path)
         time.sleep(3)
-        sys.exit()
+        return False
 
     # 3. 判断存在几个 .zip 文件
     if len(zip_files) > 1:
         log_message("Not specified.", log_file_path)
         time.sleep(3)
-        sys.exit()
+        return False
 
     # 4. 如果只有一个 .zip 文件，解压它
     zip_file_path = os.path.join(gerber_dir, zip_files[0])
 
     with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-        zip_ref.extractall(gerber_dir)
-
-    # 删除 .zip 文件
-    os.remove(zip_file_path)
-
-    log_message(f"Unzipped and removed: {zip_files[0]}", log_file_path)
+        members = [info for info in zip_ref.infolist() if not info.is_dir()]
+        selected = select_members(job, zip_ref, members)
+        for info in selected:
+            zip_ref.extract(info, gerber_dir)
+    count(job, bytes_read=os.path.getsize(zip_file_path), bytes_written=sum(info.file_size for info in selected),
+          files_read=1, files_written=len(selected))
+    skipped = len(members) - len(selected)
+    if skipped:
+        log_message(f"Extracted {len(selected)} of {len(members)} files, skipped {skipped} files not used by any rule "
+                    f"({sum(info.file_size for info in members) - sum(info.file_size for info in selected)} bytes).", log_file_path)
+
+    # 把 .zip 文件移出Gerber目录，LCEDA文件打包时直接复制其中的压缩数据
+    os.replace(zip_file_path, job['source_zip'])
+
+    log_message(f"Unzipped and moved: {zip_files[0]} -> {job['source_zip']}", log_file_path)
 
     # 记录日志结束
     log_message("[unzip.py] XC Logs done.", log_file_path)
+    return True
 
-    # 停止日志写入，恢复标准输出
-    sys.stdout = sys.__stdout__
-
-    # 延时
-    # time.sleep(0.5)
+def main():
+    if not run(load_job()):
+        sys.exit()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,69 @@
+import re
+
+# Gerber X2的文件属性，例如 %TF.FileFunction,Copper,L1,Top*%
+GERBER_ATTRIBUTE = re.compile(rb'%TF\.(FileFunction|GenerationSoftware),([^*%\r\n]*)\*%')
+# 同样的属性也可能写在注释中：关闭X2扩展格式的KiCad Gerber写成 G04 #@! TF.FileFunction,Copper,L1,Top*
+# Excellon钻孔文件写成 ; #@! TF.FileFunction,Plated,1,2,PTH
+COMMENT_ATTRIBUTE = re.compile(rb'(G04|;)\s*#@!\s*TF\.(FileFunction|GenerationSoftware),([^*\r\n]*)')
+
+# GenerationSoftware中出现的名称 -> EDA，按顺序匹配
+SOFTWARE_EDA = [
+    ('altium', 'Altium_Designer'),
+    ('kicad', 'KiCAD'),
+    ('pcbnew', 'KiCAD'),
+    ('easyeda', 'LCEDA'),
+]
+
+# FileFunction -> 规则名，Top/Bot 对应顶层/底层
+SIDED_FUNCTIONS = {
+    'Soldermask': 'SolderMask',
+    'Paste': 'SolderPaste',
+    'Legend': 'SilkScreen',
+}
+SIDES = {'Top': 'Top', 'Bot': 'Bottom'}
+
+def parse(head):
+    # 从文件开头解析X2属性，返回 属性名 -> 字段列表，以及文件格式（gerber/excellon）
+    attributes = {}
+    file_format = None
+    matches = [(m.group(1), m.group(2), 'gerber') for m in GERBER_ATTRIBUTE.finditer(head)]
+    matches += [(m.group(2), m.group(3), 'gerber' if m.group(1) == b'G04' else 'excellon') for m in COMMENT_ATTRIBUTE.finditer(head)]
+    for key, value, name in matches:
+        key = key.decode('ascii')
+        if key not in attributes:
+            attributes[key] = [field.strip() for field in value.decode('ascii', 'replace').split(',')]
+            file_format = file_format or name
+    return attributes, file_format
+
+def software_eda(attributes):
+    software = ','.join(attributes.get('GenerationSoftware', [])).lower()
+    for name, eda_tool in SOFTWARE_EDA:
+        if name in software:
+            return eda_tool
+    return None
+
+def layer_keys(attributes, file_format):
+    # 按FileFunction给出候选规则名，没有属性或者不是需要的层时返回None
+    # 钻孔文件的属性不区分过孔，候选中包含同一类的多个规则，由文件名规则在其中选择
+    function = attributes.get('FileFunction')
+    if not function:
+        return None
+    kind = function[0]
+    if kind == 'Copper' and len(function) >= 3:
+        side = function[2]
+        if side in SIDES:
+            return [f"{SIDES[side]}_Cu"]
+        layer = function[1]
+        if side == 'Inr' and layer[:1] == 'L' and layer[1:].isdigit() and int(layer[1:]) > 1:
+            # L1是顶层，内层从L2开始编号
+            return [f"InnerLayer{int(layer[1:]) - 1}_Cu"]
+        return None
+    if kind in SIDED_FUNCTIONS and len(function) >= 2 and function[1] in SIDES:
+        return [f"{SIDES[function[1]]}_{SIDED_FUNCTIONS[kind]}"]
+    if kind == 'Profile':
+        return ['Outline']
+    if kind in ('Plated', 'NonPlated'):
+        family = ['PTH', 'PTH_Via'] if kind == 'Plated' else ['NPTH']
+        gerber = [f"{key}_GBR" for key in family]
+        return gerber + family if file_format == 'gerber' else family + gerber
+    return None
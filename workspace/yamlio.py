@@ -0,0 +1,14 @@
+import yaml
+
+# 优先使用libyaml的C实现，没有编译libyaml时退回纯Python实现，两者读写结果一致
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+def load(stream):
+    return yaml.load(stream, Loader=SafeLoader)
+
+def dump(data, stream):
+    # 与原先 yaml.dump(..., default_flow_style=False, allow_unicode=True) 的输出相同
+    yaml.dump(data, stream, Dumper=SafeDumper, default_flow_style=False, allow_unicode=True)
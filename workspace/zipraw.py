@@ -0,0 +1,35 @@
+import struct
+import zipfile
+
+# zip本地文件头的格式，文件名长度和扩展字段长度分别位于第10、11项
+LOCAL_HEADER_FORMAT = '<4s2B4HL2L2H'
+LOCAL_HEADER_SIZE = struct.calcsize(LOCAL_HEADER_FORMAT)
+COPY_CHUNK_SIZE = 1024 * 1024
+
+def seek_member_data(source, info):
+    # 跳过本地文件头，定位到成员压缩数据的开头
+    source.fp.seek(info.header_offset)
+    local_header = struct.unpack(LOCAL_HEADER_FORMAT, source.fp.read(LOCAL_HEADER_SIZE))
+    source.fp.seek(local_header[10] + local_header[11], 1)
+
+def copy_data(src, dst, size, name):
+    # 分块复制size字节的压缩数据
+    remaining = size
+    while remaining > 0:
+        chunk = src.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated member: {name}")
+        dst.write(chunk)
+        remaining -= len(chunk)
+
+def write_raw_member(output, member, src):
+    # 把已经压缩好的数据写入输出压缩包，member中需要给出CRC和压缩前后的大小
+    member.header_offset = output.fp.tell()
+    output.fp.write(member.FileHeader())
+    copy_data(src, output.fp, member.compress_size, member.filename)
+
+    # 登记到输出压缩包的中央目录，close()时一并写出
+    output.filelist.append(member)
+    output.NameToInfo[member.filename] = member
+    output.start_dir = output.fp.tell()
+    output._didModify = True